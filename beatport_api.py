@@ -1,6 +1,16 @@
+import logging
+import threading
+import time
+
 from datetime import timedelta, datetime
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from utils.utils import create_requests_session
+from .beatport_cache import BeatportCache
+from .beatport_metrics import BeatportMetrics
+from .beatport_scheduler import RequestScheduler, PRIORITY_METADATA, PRIORITY_DOWNLOAD
 
 
 class BeatportError(Exception):
@@ -10,7 +20,10 @@ class BeatportError(Exception):
 
 
 class BeatportApi:
-    def __init__(self):
+    def __init__(self, cache: BeatportCache = None, pool_size: int = 10, max_retries: int = 3,
+                 backoff_factor: float = 0.5, timeout: float = 30, scheduler: RequestScheduler = None,
+                 rate_limit_retries: int = 5, refresh_margin: timedelta = timedelta(minutes=5),
+                 metrics: BeatportMetrics = None):
         self.API_URL = "https://api.beatport.com/v4/"
 
         # client id from Serato DJ Lite
@@ -21,9 +34,38 @@ class BeatportApi:
         self.refresh_token = None
         self.expires = None
 
+        # the access_token is refreshed refresh_margin before it expires by a background timer, a lock makes sure
+        # that concurrent requests only trigger a single refresh
+        self.refresh_margin = refresh_margin
+        self.credentials = None
+        self.on_session_update = None
+        self._token_lock = threading.Lock()
+        self._refresh_timer = None
+
+        # optional on-disk cache for catalog entities, see _get()
+        self.cache = cache
+        # latency, status codes, bytes, retries and cache hits of all requests
+        self.metrics = metrics or BeatportMetrics()
+
         # required for the cookies
         self.s = create_requests_session()
 
+        # keep enough connections alive for all parallel requests and retry failed requests with an exponential
+        # backoff, the responses are still returned so _get() can handle the status codes itself. 429 responses are
+        # handled by the scheduler instead, so every thread backs off and not only the throttled one
+        self.timeout = timeout
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist={500, 502, 503, 504},
+            raise_on_status=False,
+        ))
+        self.s.mount('https://', self.adapter)
+
+        # every request goes through the scheduler, see _request()
+        self.scheduler = scheduler or RequestScheduler()
+        self.rate_limit_retries = rate_limit_retries
+
     def headers(self, use_access_token: bool = False):
         return {
             'user-agent': 'libbeatport/v2.8.2',
@@ -37,7 +79,7 @@ class BeatportApi:
         }
 
         # authorize the code_challenge
-        r = self.s.get(f"{self.API_URL}auth/o/authorize/", params={
+        r = self._request('GET', f"{self.API_URL}auth/o/authorize/", params={
             "client_id": self.client_id,
             "response_type": "code",
             "redirect_uri": self.redirect_uri,
@@ -50,7 +92,7 @@ class BeatportApi:
         base_url = r.request.url.replace(r.request.path_url, '')
         referer = base_url + r.headers['location']
 
-        r = self.s.post(f"{self.API_URL}auth/login/", json={
+        r = self._request('POST', f"{self.API_URL}auth/login/", json={
             "username": username,
             "password": password,
         }, headers={**acc_headers, "Referer": referer})
@@ -59,7 +101,7 @@ class BeatportApi:
             raise ConnectionError(r.text)
 
         # get the code from the redirect url, that's why redirect is disabled
-        r = self.s.get(f"{self.API_URL}auth/o/authorize/", params={
+        r = self._request('GET', f"{self.API_URL}auth/o/authorize/", params={
             "client_id": self.client_id,
             "response_type": "code",
             "redirect_uri": self.redirect_uri,
@@ -72,7 +114,7 @@ class BeatportApi:
         code = r.headers['location'].split('code=')[1]
 
         # exchange the code for the access_token, refresh_token and expires_in
-        r = self.s.post(f"{self.API_URL}auth/o/token/", data={
+        r = self._request('POST', f"{self.API_URL}auth/o/token/", data={
             "client_id": self.client_id,
             "code": code,
             "grant_type": "authorization_code",
@@ -89,11 +131,12 @@ class BeatportApi:
         self.access_token = r['access_token']
         self.refresh_token = r['refresh_token']
         self.expires = datetime.now() + timedelta(seconds=r['expires_in'])
+        self._schedule_refresh()
 
         return r
 
     def refresh(self):
-        r = self.s.post(f'{self.API_URL}auth/o/token/', data={
+        r = self._request('POST', f'{self.API_URL}auth/o/token/', data={
             'client_id': self.client_id,
             'refresh_token': self.refresh_token,
             'grant_type': 'refresh_token',
@@ -105,11 +148,109 @@ class BeatportApi:
         self.access_token = r.json()['access_token']
         self.refresh_token = r.json()['refresh_token']
         self.expires = datetime.now() + timedelta(seconds=r.json()['expires_in'])
+        self._schedule_refresh()
+
+    def set_credentials(self, username: str, password: str):
+        # used to log in again if the refresh_token is not valid anymore
+        self.credentials = (username, password)
+
+    def session_pending(self) -> bool:
+        # there is no session yet (the login is deferred to the first request) or the access_token expires soon
+        return (self.refresh_token is None and self.credentials is not None) or self.token_expiring()
+
+    def ensure_session(self):
+        if self.refresh_token is None and self.credentials is not None:
+            with self._token_lock:
+                # another thread logged in while this one was waiting for the lock
+                if self.refresh_token is None:
+                    logging.debug('Beatport: no session found, logging in')
+                    self.auth(*self.credentials)
+
+                    if self.on_session_update:
+                        self.on_session_update()
+        elif self.token_expiring():
+            # refresh the access_token ahead of its expiry, in case the background refresh didn't run (yet)
+            self.refresh_access_token(self.access_token)
+
+    def token_expiring(self) -> bool:
+        return self.refresh_token is not None and self.expires is not None and \
+            datetime.now() + self.refresh_margin >= self.expires
+
+    def refresh_access_token(self, stale_token: str = None):
+        # all threads with the same stale_token wait for the lock, only the first one actually refreshes
+        with self._token_lock:
+            if stale_token is not None and self.access_token != stale_token:
+                return
+
+            logging.debug('Beatport: refreshing the access_token')
+            self.metrics.record_token_refresh()
+            refresh_data = self.refresh()
+            if refresh_data:
+                if self.credentials is None:
+                    raise ConnectionError(refresh_data)
+
+                # the refresh_token is invalid, log in again
+                logging.debug('Beatport: refresh failed, logging in again')
+                self.auth(*self.credentials)
+
+            if self.on_session_update:
+                self.on_session_update()
+
+    def _schedule_refresh(self):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+
+        if self.refresh_token is None or self.expires is None:
+            return
+
+        delay = max(0.0, (self.expires - self.refresh_margin - datetime.now()).total_seconds())
+        self._refresh_timer = threading.Timer(delay, self._background_refresh, args=(self.access_token,))
+        # never keep the process alive just for the refresh
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _background_refresh(self, stale_token: str):
+        try:
+            self.refresh_access_token(stale_token)
+        except Exception as e:
+            # the next request will try again synchronously
+            logging.debug(f'Beatport: background refresh failed: {e}')
+
+    def get_pool_stats(self) -> dict:
+        # urllib3 counts the opened connections and the requests per host pool, everything else was a reused connection
+        pools = self.adapter.poolmanager.pools
+        stats = {'new_connections': 0, 'requests': 0}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                stats['new_connections'] += pool.num_connections
+                stats['requests'] += pool.num_requests
+
+        stats['reused_connections'] = stats['requests'] - stats['new_connections']
+        return stats
+
+    def _request(self, method: str, url: str, priority: int = PRIORITY_METADATA, **kwargs):
+        # wait for the token bucket and retry throttled requests once the scheduler allows it again
+        for attempt in range(self.rate_limit_retries + 1):
+            self.scheduler.acquire(priority)
+            start = time.perf_counter()
+            r = self.s.request(method, url, timeout=self.timeout, **kwargs)
+
+            # the retries done by urllib3 after a 5xx response plus the retry after a 429 response
+            retry = getattr(r.raw, 'retries', None)
+            self.metrics.record_request(url.replace(self.API_URL, ''), r.status_code, time.perf_counter() - start,
+                                        len(r.content), len(retry.history if retry else ()) + (attempt > 0))
+
+            if not self.scheduler.update(r.status_code, r.headers):
+                break
+
+        return r
 
     def set_session(self, session: dict):
         self.access_token = session.get('access_token')
         self.refresh_token = session.get('refresh_token')
         self.expires = session.get('expires')
+        self._schedule_refresh()
 
     def get_session(self):
         return {
@@ -118,14 +259,43 @@ class BeatportApi:
             'expires': self.expires
         }
 
-    def _get(self, endpoint: str, params: dict = None):
+    def _get(self, endpoint: str, params: dict = None, cache_type: str = None, priority: int = PRIORITY_METADATA):
         # function for API requests
         if not params:
             params = {}
 
-        r = self.s.get(f'{self.API_URL}{endpoint}', params=params, headers=self.headers(use_access_token=True))
+        # only catalog entities with a cache_type are cached, never the account or any stream/download
+        cache_key = None
+        if self.cache is not None and cache_type is not None:
+            cache_key = BeatportCache.key(endpoint, params)
+            cached = self.cache.get(cache_key)
+            self.metrics.record_cache(endpoint, cached is not None)
+            if cached is not None:
+                return cached
+
+        # log in or refresh the access_token on the first request which needs it
+        if self.session_pending():
+            self.ensure_session()
+
+        access_token = self.access_token
+        r = self._request('GET', f'{self.API_URL}{endpoint}', priority=priority, params=params,
+                          headers=self.headers(use_access_token=True))
 
-        # access_token expired
+        # access_token expired or revoked, refresh it once and try again
+        if r.status_code == 401:
+            self.refresh_access_token(access_token)
+            r = self._request('GET', f'{self.API_URL}{endpoint}', priority=priority, params=params,
+                              headers=self.headers(use_access_token=True))
+
+        data = self.parse_response(r)
+        if cache_key is not None:
+            self.cache.set(cache_key, data, cache_type)
+
+        return data
+
+    @staticmethod
+    def parse_response(r) -> dict:
+        # shared with AsyncBeatportApi, works for requests and httpx responses
         if r.status_code == 401:
             raise ValueError(r.text)
 
@@ -135,7 +305,10 @@ class BeatportApi:
                 raise BeatportError("region locked")
 
         if r.status_code not in {200, 201, 202}:
-            raise ConnectionError(r.text)
+            # the status code decides if BeatportSessionPool tries another account
+            error = ConnectionError(r.text)
+            error.status_code = r.status_code
+            raise error
 
         return r.json()
 
@@ -143,16 +316,31 @@ class BeatportApi:
         return self._get('auth/o/introspect')
 
     def get_track(self, track_id: str):
-        return self._get(f'catalog/tracks/{track_id}')
+        return self._get(f'catalog/tracks/{track_id}', cache_type='track')
+
+    def get_tracks(self, track_ids: list, page: int = 1, per_page: int = 100):
+        # multiple tracks at once with the id filter of the catalog
+        return self._get('catalog/tracks', params={
+            'id': ','.join(str(i) for i in track_ids),
+            'page': page,
+            'per_page': per_page
+        })
+
+    def get_releases(self, release_ids: list, page: int = 1, per_page: int = 100):
+        return self._get('catalog/releases', params={
+            'id': ','.join(str(i) for i in release_ids),
+            'page': page,
+            'per_page': per_page
+        })
 
     def get_release(self, release_id: str):
-        return self._get(f'catalog/releases/{release_id}')
+        return self._get(f'catalog/releases/{release_id}', cache_type='release')
 
     def get_release_tracks(self, release_id: str, page: int = 1, per_page: int = 100):
         return self._get(f'catalog/releases/{release_id}/tracks', params={
             'page': page,
             'per_page': per_page
-        })
+        }, cache_type='release')
 
     def get_playlist(self, playlist_id: str):
         return self._get(f'catalog/playlists/{playlist_id}')
@@ -163,8 +351,18 @@ class BeatportApi:
             'per_page': per_page
         })
 
+    def get_genre(self, genre_id: str):
+        return self._get(f'catalog/genres/{genre_id}')
+
+    def get_genre_top_tracks(self, genre_id: str, page: int = 1, per_page: int = 100):
+        # the Beatport top 100 of a genre
+        return self._get(f'catalog/genres/{genre_id}/top/100', params={
+            'page': page,
+            'per_page': per_page
+        })
+
     def get_chart(self, chart_id: str):
-        return self._get(f'catalog/charts/{chart_id}')
+        return self._get(f'catalog/charts/{chart_id}', cache_type='chart')
 
     def get_chart_tracks(self, chart_id: str, page: int = 1, per_page: int = 100):
         return self._get(f'catalog/charts/{chart_id}/tracks', params={
@@ -173,22 +371,35 @@ class BeatportApi:
         })
 
     def get_artist(self, artist_id: str):
-        return self._get(f'catalog/artists/{artist_id}')
+        return self._get(f'catalog/artists/{artist_id}', cache_type='artist')
 
-    def get_artist_tracks(self, artist_id: str, page: int = 1, per_page: int = 100):
-        return self._get(f'catalog/artists/{artist_id}/tracks', params={
+    def get_artist_tracks(self, artist_id: str, page: int = 1, per_page: int = 100, order_by: str = None):
+        params = {
             'page': page,
             'per_page': per_page
-        })
+        }
+        if order_by:
+            # e.g. '-publish_date' for the newest tracks first
+            params['order_by'] = order_by
+
+        return self._get(f'catalog/artists/{artist_id}/tracks', params=params)
 
     def get_label(self, label_id: str):
-        return self._get(f'catalog/labels/{label_id}')
+        return self._get(f'catalog/labels/{label_id}', cache_type='label')
+
+    def get_label_releases(self, label_id: str, page: int = 1, per_page: int = 100):
+        return self._get(f'catalog/labels/{label_id}/releases', params={
+            'page': page,
+            'per_page': per_page
+        })
 
-    def get_label_releases(self, label_id: str):
-        return self._get(f'catalog/labels/{label_id}/releases')
+    def get_search(self, query: str, per_page: int = None):
+        params = {'q': query}
+        if per_page:
+            # results per type, the API default is used otherwise
+            params['per_page'] = per_page
 
-    def get_search(self, query: str):
-        return self._get('catalog/search', params={'q': query})
+        return self._get('catalog/search', params=params)
 
     def get_track_stream(self, track_id: str):
         # get the 128k stream (.m3u8) for a given track id from needledrop.beatport.com
@@ -196,4 +407,5 @@ class BeatportApi:
 
     def get_track_download(self, track_id: str, quality: str):
         # get the 256k stream (.mp4) for a given track id
-        return self._get(f'catalog/tracks/{track_id}/download', params={'quality': quality})
+        return self._get(f'catalog/tracks/{track_id}/download', params={'quality': quality},
+                         priority=PRIORITY_DOWNLOAD)
@@ -0,0 +1,142 @@
+import logging
+import os
+import re
+import tempfile
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from utils.utils import create_requests_session
+
+
+class ArtworkRequestHandler(BaseHTTPRequestHandler):
+    server: "ArtworkServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        key = self.path.strip("/")
+        try:
+            data = self.server.cache.fetch(key)
+        except KeyError:
+            self.send_error(404)
+            return
+        except Exception as e:
+            logging.debug(f"Beatport: artwork {key} failed: {e}")
+            self.send_error(502)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class ArtworkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cache: "ArtworkCache"):
+        super().__init__(("127.0.0.1", 0), ArtworkRequestHandler)
+        self.cache = cache
+
+
+class ArtworkCache:
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, timeout: float = 30):
+        # one file per release image and resolution, so the cover of a release is only downloaded once no matter how
+        # many of its tracks are downloaded. orpheus downloads the covers itself, so they are served to it by a
+        # loopback HTTP server
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        os.makedirs(path, exist_ok=True)
+
+        # key -> original cover URL
+        self.sources = {}
+        # one lock per key, so concurrent requests of the same cover wait for the first download
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.s = create_requests_session()
+
+        self._server = None
+
+    @staticmethod
+    def key(cover_url: str) -> str:
+        # https://geo-media.beatport.com/image_size/1400x1400/<image id>.jpg -> <image id>_1400x1400
+        url = urlparse(cover_url)
+        image_id = os.path.splitext(os.path.basename(url.path))[0]
+        size = re.search(r"\d+x\d+", url.path)
+        return re.sub(r"[^\w-]", "_", f"{image_id}_{size.group(0) if size else 'original'}")
+
+    def url(self, cover_url: str) -> str:
+        # returns the loopback URL of the cached cover_url
+        key = self.key(cover_url)
+        with self._lock:
+            self.sources.setdefault(key, cover_url)
+            if self._server is None:
+                self._server = ArtworkServer(self)
+                threading.Thread(target=self._server.serve_forever, name="beatport-artwork", daemon=True).start()
+
+        return f"http://127.0.0.1:{self._server.server_address[1]}/{key}"
+
+    def fetch(self, key: str) -> bytes:
+        # returns the cached cover, downloads it if needed. Raises a KeyError for unknown keys
+        source = self.sources[key]
+        path = os.path.join(self.path, key + ".jpg")
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+
+        with lock:
+            try:
+                # keep the recently used covers on eviction
+                os.utime(path)
+                with open(path, "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                # not cached yet or evicted in the meantime
+                pass
+
+            r = self.s.get(source, timeout=self.timeout)
+            r.raise_for_status()
+
+            # write to a unique temporary file first, so a cover is never read half written, also not by another
+            # process sharing the cache
+            fd, temp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(r.content)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+        self._evict(path, len(r.content))
+        return r.content
+
+    def _evict(self, keep: str, keep_size: int):
+        # delete the least recently used covers until the cache is below max_bytes, never the cover which was just
+        # downloaded
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.path):
+                if entry.is_file() and entry.name.endswith(".jpg") and entry.path != keep:
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in files) + keep_size
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,209 @@
+import asyncio
+import time
+
+from .beatport_api import BeatportApi
+from .beatport_cache import BeatportCache
+from .beatport_scheduler import PRIORITY_METADATA, PRIORITY_DOWNLOAD
+
+# httpx is optional, without it all bulk lookups use the thread pool of the ModuleInterface
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class AsyncBeatportApi:
+    def __init__(self, api: BeatportApi, max_concurrency: int = 20):
+        if httpx is None:
+            raise ImportError("httpx is required for the AsyncBeatportApi, install it with 'pip install httpx'")
+
+        # the synchronous api holds the shared auth state, the cache and the scheduler
+        self.api = api
+        self.max_concurrency = max_concurrency
+
+        self._client = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            timeout=self.api.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency,
+                                max_keepalive_connections=self.max_concurrency))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._client.aclose()
+        self._client = None
+
+    async def _request(self, url: str, priority: int, params: dict):
+        # same as BeatportApi._request(), the scheduler is shared with all synchronous requests. Transport errors and
+        # 5xx responses are retried with the exponential backoff of the urllib3 Retry of the synchronous api
+        retry = self.api.adapter.max_retries
+        errors, throttled = 0, 0
+        async with self._semaphore:
+            while True:
+                await self.api.scheduler.acquire_async(priority)
+                start = time.perf_counter()
+                try:
+                    r = await self._client.get(url, params=params, headers=self.api.headers(use_access_token=True))
+                except httpx.TransportError as e:
+                    if errors >= retry.total:
+                        raise ConnectionError(str(e))
+                    errors += 1
+                    await asyncio.sleep(retry.backoff_factor * 2 ** (errors - 1))
+                    continue
+
+                self.api.metrics.record_request(url.replace(self.api.API_URL, ''), r.status_code,
+                                                time.perf_counter() - start, len(r.content),
+                                                int(errors + throttled > 0))
+
+                if r.status_code in retry.status_forcelist and errors < retry.total:
+                    errors += 1
+                    await asyncio.sleep(retry.backoff_factor * 2 ** (errors - 1))
+                    continue
+
+                if not self.api.scheduler.update(r.status_code, r.headers) or throttled >= self.api.rate_limit_retries:
+                    break
+                throttled += 1
+
+        return r
+
+    async def _get(self, endpoint: str, params: dict = None, cache_type: str = None,
+                   priority: int = PRIORITY_METADATA):
+        if not params:
+            params = {}
+
+        cache_key = None
+        if self.api.cache is not None and cache_type is not None:
+            cache_key = BeatportCache.key(endpoint, params)
+            cached = self.api.cache.get(cache_key)
+            self.api.metrics.record_cache(endpoint, cached is not None)
+            if cached is not None:
+                return cached
+
+        # the login and the token refresh are locked and blocking, so run them outside the event loop
+        if self.api.session_pending():
+            await asyncio.to_thread(self.api.ensure_session)
+
+        access_token = self.api.access_token
+        r = await self._request(f'{self.api.API_URL}{endpoint}', priority, params)
+
+        # access_token expired or revoked, refresh it once and try again
+        if r.status_code == 401:
+            await asyncio.to_thread(self.api.refresh_access_token, access_token)
+            r = await self._request(f'{self.api.API_URL}{endpoint}', priority, params)
+
+        data = BeatportApi.parse_response(r)
+        if cache_key is not None:
+            self.api.cache.set(cache_key, data, cache_type)
+
+        return data
+
+    async def get_account(self):
+        return await self._get('auth/o/introspect')
+
+    async def get_track(self, track_id: str):
+        return await self._get(f'catalog/tracks/{track_id}', cache_type='track')
+
+    async def get_tracks(self, track_ids: list, page: int = 1, per_page: int = 100):
+        return await self._get('catalog/tracks', params={
+            'id': ','.join(str(i) for i in track_ids),
+            'page': page,
+            'per_page': per_page
+        })
+
+    async def get_releases(self, release_ids: list, page: int = 1, per_page: int = 100):
+        return await self._get('catalog/releases', params={
+            'id': ','.join(str(i) for i in release_ids),
+            'page': page,
+            'per_page': per_page
+        })
+
+    async def get_release(self, release_id: str):
+        return await self._get(f'catalog/releases/{release_id}', cache_type='release')
+
+    async def get_release_tracks(self, release_id: str, page: int = 1, per_page: int = 100):
+        return await self._get(f'catalog/releases/{release_id}/tracks', params={
+            'page': page,
+            'per_page': per_page
+        }, cache_type='release')
+
+    async def get_playlist(self, playlist_id: str):
+        return await self._get(f'catalog/playlists/{playlist_id}')
+
+    async def get_playlist_tracks(self, playlist_id: str, page: int = 1, per_page: int = 100):
+        return await self._get(f'catalog/playlists/{playlist_id}/tracks', params={
+            'page': page,
+            'per_page': per_page
+        })
+
+    async def get_genre(self, genre_id: str):
+        return await self._get(f'catalog/genres/{genre_id}')
+
+    async def get_genre_top_tracks(self, genre_id: str, page: int = 1, per_page: int = 100):
+        return await self._get(f'catalog/genres/{genre_id}/top/100', params={
+            'page': page,
+            'per_page': per_page
+        })
+
+    async def get_chart(self, chart_id: str):
+        return await self._get(f'catalog/charts/{chart_id}', cache_type='chart')
+
+    async def get_chart_tracks(self, chart_id: str, page: int = 1, per_page: int = 100):
+        return await self._get(f'catalog/charts/{chart_id}/tracks', params={
+            'page': page,
+            'per_page': per_page
+        })
+
+    async def get_artist(self, artist_id: str):
+        return await self._get(f'catalog/artists/{artist_id}', cache_type='artist')
+
+    async def get_artist_tracks(self, artist_id: str, page: int = 1, per_page: int = 100, order_by: str = None):
+        params = {
+            'page': page,
+            'per_page': per_page
+        }
+        if order_by:
+            params['order_by'] = order_by
+
+        return await self._get(f'catalog/artists/{artist_id}/tracks', params=params)
+
+    async def get_label(self, label_id: str):
+        return await self._get(f'catalog/labels/{label_id}', cache_type='label')
+
+    async def get_label_releases(self, label_id: str, page: int = 1, per_page: int = 100):
+        return await self._get(f'catalog/labels/{label_id}/releases', params={
+            'page': page,
+            'per_page': per_page
+        })
+
+    async def get_search(self, query: str, per_page: int = None):
+        params = {'q': query}
+        if per_page:
+            params['per_page'] = per_page
+
+        return await self._get('catalog/search', params=params)
+
+    async def get_track_stream(self, track_id: str):
+        return await self._get(f'catalog/tracks/{track_id}/stream')
+
+    async def get_track_download(self, track_id: str, quality: str):
+        return await self._get(f'catalog/tracks/{track_id}/download', params={'quality': quality},
+                               priority=PRIORITY_DOWNLOAD)
+
+
+class BulkBeatportApi:
+    # synchronous facade for the ModuleInterface, runs many AsyncBeatportApi calls on a short-lived event loop
+    def __init__(self, api: BeatportApi, max_concurrency: int = 20):
+        self.api = api
+        self.max_concurrency = max_concurrency
+
+    def map(self, method: str, args_list: list) -> list:
+        # returns the results in the order of args_list, failed calls return their exception instead of raising it
+        async def run():
+            async with AsyncBeatportApi(self.api, self.max_concurrency) as async_api:
+                return await asyncio.gather(*[getattr(async_api, method)(*args) for args in args_list],
+                                            return_exceptions=True)
+
+        return asyncio.run(run())
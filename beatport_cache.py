@@ -0,0 +1,94 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# time to live in seconds for every cached entity type, released tracks and releases hardly ever change while
+# charts and playlists are updated by their curators all the time
+CACHE_TTLS = {
+    "track": 30 * 24 * 60 * 60,
+    "release": 30 * 24 * 60 * 60,
+    "artist": 24 * 60 * 60,
+    "label": 24 * 60 * 60,
+    "chart": 60 * 60,
+    "playlist": 60 * 60,
+    # tracks and releases which are not released yet
+    "preorder": 60 * 60,
+}
+
+
+class BeatportCache:
+    def __init__(self, path: str, max_entries: int = 50000, ttls: dict = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = {**CACHE_TTLS, **(ttls or {})}
+
+        # only evict every few writes, counting the rows on every write is not worth it
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # the connection is shared between the page fetching threads, all access is guarded by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache ("
+                         "key TEXT PRIMARY KEY, "
+                         "value TEXT NOT NULL, "
+                         "expires REAL NOT NULL, "
+                         "last_access REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+        self._db.commit()
+
+    @staticmethod
+    def key(endpoint: str, params: dict = None) -> str:
+        # sort the params so the same request always results in the same key
+        return endpoint + "?" + json.dumps(params or {}, sort_keys=True)
+
+    def get(self, key: str) -> dict or None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            if row[1] < now:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+
+            self._db.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict, cache_type: str):
+        # preorders will change once they are released, so don't keep them for long
+        if cache_type in {"track", "release"} and value.get("preorder"):
+            cache_type = "preorder"
+
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO cache (key, value, expires, last_access) VALUES (?, ?, ?, ?)",
+                             (key, json.dumps(value), now + self.ttls[cache_type], now))
+
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict(now)
+
+            self._db.commit()
+
+    def _evict(self, now: float):
+        # drop all expired entries first, then the least recently used ones above max_entries
+        self._db.execute("DELETE FROM cache WHERE expires < ?", (now,))
+        self._db.execute("DELETE FROM cache WHERE key IN "
+                         "(SELECT key FROM cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM cache")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
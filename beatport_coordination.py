@@ -0,0 +1,119 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+# shared collection expansions are fetched again after this many seconds
+METADATA_TTL = 60 * 60
+
+
+class WorkQueue:
+    def __init__(self, path: str, node_id: str = None, lease_seconds: float = 600):
+        # lease based work queue shared by all nodes through one SQLite database, e.g. on a network share. Every node
+        # claims items for lease_seconds and renews the leases of its claimed items in the background, so the items of
+        # a crashed node are claimed by another node once its leases expired
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # no WAL, it doesn't work on network file systems. isolation_level=None so claims can use BEGIN IMMEDIATE
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._db.execute("CREATE TABLE IF NOT EXISTS work ("
+                         "job TEXT NOT NULL, "
+                         "item TEXT NOT NULL, "
+                         "position INTEGER NOT NULL, "
+                         "state TEXT NOT NULL DEFAULT 'pending', "
+                         "owner TEXT, "
+                         "lease_until REAL, "
+                         "PRIMARY KEY (job, item))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS metadata ("
+                         "key TEXT PRIMARY KEY, "
+                         "value TEXT NOT NULL, "
+                         "updated REAL NOT NULL)")
+
+        if node_id:
+            # a restarted node would otherwise keep renewing the leases of the items its crashed predecessor claimed
+            self._db.execute("UPDATE work SET state = 'pending', owner = NULL, lease_until = NULL "
+                             "WHERE owner = ? AND state = 'claimed'", (self.node_id,))
+
+        self._renew_thread = threading.Thread(target=self._renew_leases, name="beatport-leases", daemon=True)
+        self._renew_thread.start()
+
+    def _renew_leases(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._lock:
+                self._db.execute("UPDATE work SET lease_until = ? WHERE owner = ? AND state = 'claimed'",
+                                 (time.time() + self.lease_seconds, self.node_id))
+
+    def enqueue(self, job: str, items: list):
+        # items which are already queued keep their state, so completed items are never done twice
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("INSERT OR IGNORE INTO work (job, item, position) VALUES (?, ?, ?)",
+                                     [(job, str(item), position) for position, item in enumerate(items)])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def claim(self, job: str, item) -> bool:
+        # claims a pending item of the job or an item whose lease expired, completed items are never claimed again
+        now = time.time()
+        with self._lock:
+            return self._db.execute(
+                "UPDATE work SET state = 'claimed', owner = ?, lease_until = ? WHERE job = ? AND item = ? AND "
+                "(state = 'pending' OR (state = 'claimed' AND (lease_until < ? OR owner = ?)))",
+                (self.node_id, now + self.lease_seconds, job, str(item), now, self.node_id)).rowcount == 1
+
+    def claim_item(self, job: str, item: str) -> bool:
+        # claims a single item no matter if it was completed before, unless another node holds a valid lease
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("INSERT OR IGNORE INTO work (job, item, position) VALUES (?, ?, 0)", (job, item))
+                claimed = self._db.execute(
+                    "UPDATE work SET state = 'claimed', owner = ?, lease_until = ? WHERE job = ? AND item = ? AND "
+                    "(state != 'claimed' OR lease_until < ? OR owner = ?)",
+                    (self.node_id, now + self.lease_seconds, job, item, now, self.node_id)).rowcount == 1
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+        return claimed
+
+    def complete(self, job: str, item):
+        with self._lock:
+            self._db.execute("UPDATE work SET state = 'done', owner = NULL, lease_until = NULL "
+                             "WHERE job = ? AND item = ?", (job, str(item)))
+
+    def release(self, job: str, item):
+        # give up the claim, e.g. after an error, so another node can take it right away
+        with self._lock:
+            self._db.execute("UPDATE work SET state = 'pending', owner = NULL, lease_until = NULL "
+                             "WHERE job = ? AND item = ? AND owner = ?", (job, str(item), self.node_id))
+
+    def remaining(self, job: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM work WHERE job = ? AND state != 'done'",
+                                    (job,)).fetchone()[0]
+
+    def get_metadata(self, key: str, max_age: float = METADATA_TTL):
+        with self._lock:
+            row = self._db.execute("SELECT value, updated FROM metadata WHERE key = ?", (key,)).fetchone()
+
+        if row is None or time.time() - row[1] > max_age:
+            return None
+
+        return json.loads(row[0])
+
+    def set_metadata(self, key: str, value):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO metadata (key, value, updated) VALUES (?, ?, ?)",
+                             (key, json.dumps(value), time.time()))
@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+from utils.utils import create_requests_session
+
+
+class RangedDownloader:
+    def __init__(self, connections: int = 4, chunk_size: int = 8 * 1024 * 1024, retries: int = 3,
+                 timeout: float = 30):
+        # downloads a file with concurrent HTTP Range requests into a preallocated file, every chunk is retried and
+        # resumed at the last written byte on its own
+        self.connections = max(1, connections)
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+
+        # the signed CDN URLs don't need the cookies or the authorization of the BeatportApi session
+        self.s = create_requests_session()
+        self.s.mount('https://', HTTPAdapter(pool_connections=self.connections, pool_maxsize=self.connections))
+
+    def _probe(self, url: str) -> tuple:
+        # returns the total size if the server supports range requests and the ETag of the file
+        r = self.s.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=self.timeout)
+        r.close()
+        if r.status_code != 206:
+            return None, None
+
+        match = re.match(r'bytes 0-0/(\d+)', r.headers.get('Content-Range', ''))
+        return int(match.group(1)) if match else None, r.headers.get('ETag')
+
+    def _download_single(self, url: str, path: str):
+        with self.s.get(url, stream=True, timeout=self.timeout) as r:
+            r.raise_for_status()
+            with open(path, 'wb') as f:
+                for data in r.iter_content(chunk_size=1024 * 1024):
+                    f.write(data)
+
+    def _download_chunk(self, url: str, path: str, start: int, end: int, progress: dict, lock: threading.Lock,
+                        on_progress=None):
+        # progress[start] is the number of bytes of this chunk already written, used to resume after an error
+        for attempt in range(self.retries + 1):
+            offset = start + progress[start]
+            if offset > end:
+                return
+
+            try:
+                with self.s.get(url, headers={'Range': f'bytes={offset}-{end}'}, stream=True,
+                                timeout=self.timeout) as r:
+                    if r.status_code != 206:
+                        raise ConnectionError(f'unexpected status code {r.status_code} for range {offset}-{end}')
+
+                    with open(path, 'r+b') as f:
+                        f.seek(offset)
+                        for data in r.iter_content(chunk_size=256 * 1024):
+                            f.write(data)
+                            with lock:
+                                progress[start] += len(data)
+                            if on_progress:
+                                on_progress()
+
+                if start + progress[start] > end:
+                    return
+            except OSError as e:
+                # ConnectionError and all requests exceptions are subclasses of OSError
+                if attempt == self.retries:
+                    raise
+                logging.debug(f'Beatport: chunk {offset}-{end} failed, resuming: {e}')
+
+        raise ConnectionError(f'chunk {start}-{end} incomplete after {self.retries} retries')
+
+    def download(self, url: str, path: str, total: int = None, progress: dict = None, on_progress=None) -> str:
+        total = total or self._probe(url)[0]
+        if not total:
+            # no range support, fall back to a single connection
+            self._download_single(url, path)
+            return path
+
+        # preallocate the whole file, every chunk writes into its own region
+        with open(path, 'ab') as f:
+            if f.tell() != total:
+                f.truncate(total)
+
+        chunks = [(start, min(start + self.chunk_size, total) - 1) for start in range(0, total, self.chunk_size)]
+        progress = progress if progress is not None else {}
+        for start, _ in chunks:
+            progress.setdefault(start, 0)
+
+        lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=min(self.connections, len(chunks))) as executor:
+            futures = [executor.submit(self._download_chunk, url, path, start, end, progress, lock, on_progress)
+                       for start, end in chunks]
+            for future in futures:
+                future.result()
+
+        return path
+
+    def download_resumable(self, url: str, part_path: str) -> str:
+        # downloads into part_path and records the written ranges in part_path.json, so an interrupted download is
+        # resumed with range requests if the length and the ETag of the file didn't change. Returns part_path
+        checkpoint_path = part_path + '.json'
+        total, etag = self._probe(url)
+        if not total:
+            # without range support there is nothing to resume
+            self._download_single(url, part_path)
+            return part_path
+
+        progress = {}
+        if os.path.exists(part_path) and os.path.exists(checkpoint_path):
+            try:
+                with open(checkpoint_path) as f:
+                    checkpoint = json.load(f)
+                if checkpoint.get('total') == total and checkpoint.get('etag') == etag and \
+                        checkpoint.get('chunk_size') == self.chunk_size:
+                    progress = {int(start): written for start, written in checkpoint.get('progress').items()}
+                    logging.debug(f'Beatport: resuming {part_path} at {sum(progress.values())}/{total} bytes')
+            except (OSError, ValueError, AttributeError):
+                progress = {}
+
+        if not progress and os.path.exists(part_path):
+            # the file changed or there is no checkpoint, start from byte zero
+            os.remove(part_path)
+
+        lock = threading.Lock()
+        last_save = [0.0]
+
+        def save_checkpoint(force: bool = False):
+            # at most once per second, written atomically so an interrupted write never corrupts the checkpoint
+            with lock:
+                if not force and time.monotonic() - last_save[0] < 1:
+                    return
+                last_save[0] = time.monotonic()
+
+                with open(checkpoint_path + '.tmp', 'w') as f:
+                    json.dump({'total': total, 'etag': etag, 'chunk_size': self.chunk_size,
+                               'progress': dict(progress)}, f)
+                os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+        try:
+            self.download(url, part_path, total=total, progress=progress, on_progress=save_checkpoint)
+        except BaseException:
+            save_checkpoint(force=True)
+            raise
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return part_path
+
+
+class JobManifests:
+    def __init__(self, path: str):
+        # one JSON file per playlist, chart, release or artist with all its tracks and the completed ones, deleted
+        # once every track is completed
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, job: str) -> str:
+        return os.path.join(self.path, re.sub(r'[^\w-]', '_', job) + '.json')
+
+    def _read(self, job: str) -> dict or None:
+        try:
+            with open(self._file(job)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, job: str, manifest: dict):
+        with open(self._file(job) + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(self._file(job) + '.tmp', self._file(job))
+
+    def start(self, job: str, track_ids: list) -> set:
+        # returns the track ids which were already completed by a previous run of the same job
+        with self._lock:
+            manifest = self._read(job) or {'completed': []}
+            manifest['tracks'] = [str(t) for t in track_ids]
+            if set(manifest['tracks']) <= set(manifest['completed']):
+                # nothing left to do, e.g. an incremental sync without new tracks
+                if os.path.exists(self._file(job)):
+                    os.remove(self._file(job))
+            else:
+                self._write(job, manifest)
+            return set(manifest['completed'])
+
+    def complete(self, job: str, track_id):
+        with self._lock:
+            manifest = self._read(job)
+            if manifest is None:
+                return
+
+            if str(track_id) not in manifest['completed']:
+                manifest['completed'].append(str(track_id))
+
+            if set(manifest['tracks']) <= set(manifest['completed']):
+                os.remove(self._file(job))
+            else:
+                self._write(job, manifest)
@@ -0,0 +1,171 @@
+import logging
+import os
+import re
+import shutil
+import subprocess
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from requests.adapters import HTTPAdapter
+
+from utils.utils import create_requests_session
+
+# pycryptodome is only needed for encrypted streams
+try:
+    from Crypto.Cipher import AES
+except ImportError:
+    try:
+        from Cryptodome.Cipher import AES
+    except ImportError:
+        AES = None
+
+ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class HlsSegment:
+    __slots__ = ("url", "sequence", "key_url", "iv", "byte_range")
+
+    def __init__(self, url: str, sequence: int, key_url: str = None, iv: bytes = None, byte_range: str = None):
+        self.url = url
+        self.sequence = sequence
+        # AES-128 key of the segment, None if it isn't encrypted
+        self.key_url = key_url
+        self.iv = iv
+        self.byte_range = byte_range
+
+
+def parse_attributes(line: str) -> dict:
+    # #EXT-X-KEY:METHOD=AES-128,URI="https://...",IV=0x... -> {"METHOD": "AES-128", "URI": "https://...", ...}
+    return {k: v.strip('"') for k, v in ATTRIBUTE_PATTERN.findall(line.split(":", 1)[1])}
+
+
+class HlsDownloader:
+    def __init__(self, workers: int = 4, timeout: float = 30, retries: int = 3):
+        # downloads the segments of a HLS media playlist concurrently and writes them in order into one file, only
+        # workers * 2 segments are kept in memory at the same time
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.retries = retries
+
+        self.s = create_requests_session()
+        self.s.mount('https://', HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers,
+                                             max_retries=retries))
+        self._keys = {}
+
+    def _get(self, url: str, headers: dict = None):
+        r = self.s.get(url, headers=headers, timeout=self.timeout)
+        r.raise_for_status()
+        return r
+
+    def parse_playlist(self, url: str) -> tuple:
+        # returns the init segment URL (EXT-X-MAP of fragmented MP4 streams) and all media segments
+        lines = [line.strip() for line in self._get(url).text.splitlines() if line.strip()]
+
+        # a master playlist, use the variant with the highest bandwidth
+        variants = []
+        for i, line in enumerate(lines):
+            if line.startswith("#EXT-X-STREAM-INF") and i + 1 < len(lines):
+                variants.append((int(parse_attributes(line).get("BANDWIDTH") or 0), urljoin(url, lines[i + 1])))
+        if variants:
+            return self.parse_playlist(max(variants)[1])
+
+        init_url = None
+        segments = []
+        sequence = 0
+        key_url, iv = None, None
+        byte_range = None
+        for line in lines:
+            if line.startswith("#EXT-X-MEDIA-SEQUENCE"):
+                sequence = int(line.split(":", 1)[1])
+            elif line.startswith("#EXT-X-KEY"):
+                attributes = parse_attributes(line)
+                if attributes.get("METHOD") == "AES-128":
+                    key_url = urljoin(url, attributes.get("URI"))
+                    iv = bytes.fromhex(attributes["IV"][2:]) if attributes.get("IV") else None
+                elif attributes.get("METHOD") == "NONE":
+                    key_url, iv = None, None
+                else:
+                    raise ValueError(f"unsupported HLS encryption {attributes.get('METHOD')}")
+            elif line.startswith("#EXT-X-MAP"):
+                init_url = urljoin(url, parse_attributes(line).get("URI"))
+            elif line.startswith("#EXT-X-BYTERANGE"):
+                byte_range = line.split(":", 1)[1]
+            elif not line.startswith("#"):
+                segments.append(HlsSegment(urljoin(url, line), sequence, key_url, iv, byte_range))
+                sequence += 1
+                byte_range = None
+
+        return init_url, segments
+
+    def _key(self, key_url: str) -> bytes:
+        # the same key is usually used for all segments, so only request it once
+        if key_url not in self._keys:
+            self._keys[key_url] = self._get(key_url).content
+        return self._keys[key_url]
+
+    def _segment(self, segment: HlsSegment) -> bytes:
+        headers = None
+        if segment.byte_range:
+            # EXT-X-BYTERANGE: <length>[@<offset>]
+            length, _, offset = segment.byte_range.partition("@")
+            offset = int(offset or 0)
+            headers = {"Range": f"bytes={offset}-{offset + int(length) - 1}"}
+
+        data = self._get(segment.url, headers=headers).content
+        if segment.key_url is None:
+            return data
+
+        if AES is None:
+            raise ModuleNotFoundError("pycryptodome is required for encrypted HLS streams")
+
+        # without an IV attribute the media sequence number is the IV
+        iv = segment.iv or segment.sequence.to_bytes(16, "big")
+        data = AES.new(self._key(segment.key_url), AES.MODE_CBC, iv).decrypt(data)
+        # remove the PKCS7 padding
+        return data[:-data[-1]] if data and 0 < data[-1] <= 16 else data
+
+    def download(self, url: str, path: str) -> str:
+        init_url, segments = self.parse_playlist(url)
+        if not segments:
+            raise ValueError(f"HLS playlist {url} has no segments")
+
+        with open(path, "wb") as f:
+            if init_url:
+                f.write(self._get(init_url).content)
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="beatport-hls") as executor:
+                # bounded window: submit the next segment only once the oldest one is written
+                pending = deque()
+                remaining = iter(segments)
+                for segment in remaining:
+                    pending.append(executor.submit(self._segment, segment))
+                    if len(pending) >= self.workers * 2:
+                        break
+
+                while pending:
+                    f.write(pending.popleft().result())
+                    segment = next(remaining, None)
+                    if segment is not None:
+                        pending.append(executor.submit(self._segment, segment))
+
+        return self.remux(path)
+
+    @staticmethod
+    def remux(path: str) -> str:
+        # MPEG-TS segments are remuxed into an .m4a container so the file can be tagged, fragmented MP4 segments are
+        # already a valid file
+        with open(path, "rb") as f:
+            if f.read(1) != b"\x47":
+                return path
+
+        if shutil.which("ffmpeg") is None:
+            logging.warning("Beatport: ffmpeg is not installed, keeping the MPEG-TS stream")
+            return path
+
+        remuxed_path = path + ".m4a"
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", path, "-map", "0:a", "-c", "copy",
+                        "-bsf:a", "aac_adtstoasc", remuxed_path], check=True)
+        os.remove(path)
+        return remuxed_path
@@ -0,0 +1,116 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+
+class DownloadIndex:
+    def __init__(self, path: str, store_path: str, max_bytes: int = 2048 * 1024 * 1024):
+        # every completed download by track id and quality, so a track which shows up in several charts, playlists or
+        # artists is only downloaded once. The same recording on another release is found by its ISRC. The files are
+        # copied into store_path, the least recently used ones are deleted above max_bytes, 0 only records the downloads
+        self.store_path = store_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(store_path, exist_ok=True)
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS downloads ("
+                         "track_id TEXT NOT NULL, "
+                         "quality TEXT NOT NULL, "
+                         "isrc TEXT, "
+                         "path TEXT NOT NULL, "
+                         "codec TEXT NOT NULL, "
+                         "added REAL NOT NULL, "
+                         "PRIMARY KEY (track_id, quality))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS downloads_isrc ON downloads (isrc, quality)")
+        self._db.commit()
+
+    def get(self, track_id, quality: str, isrc: str = None) -> str or None:
+        # returns the path of the stored file of the track or of another track with the same ISRC
+        with self._lock:
+            rows = self._db.execute("SELECT track_id, path, quality FROM downloads WHERE track_id = ? AND quality = ?",
+                                    (str(track_id), quality)).fetchall()
+            if not rows and isrc:
+                rows = self._db.execute("SELECT track_id, path, quality FROM downloads WHERE isrc = ? AND quality = ?",
+                                        (isrc, quality)).fetchall()
+
+        # the stored file could be evicted already
+        for row in rows:
+            if os.path.exists(row[1]):
+                # keep the recently used files on eviction
+                os.utime(row[1])
+                return row[1]
+
+        return None
+
+    def indexed(self, tracks: list, quality: str = None) -> set:
+        # returns the ids of the track dicts which were already downloaded, in any quality if quality is None, no matter
+        # if their file is still stored
+        track_ids = [str(t.get("id")) for t in tracks]
+        isrcs = {}
+        for track in tracks:
+            if track.get("isrc"):
+                isrcs.setdefault(track.get("isrc"), set()).add(str(track.get("id")))
+        quality_filter = " AND quality = ?" if quality else ""
+
+        rows = []
+        with self._lock:
+            # stay below the SQLite variable limit
+            for i in range(0, max(len(track_ids), len(isrcs)), 500):
+                for column, values in [("track_id", track_ids[i:i + 500]), ("isrc", list(isrcs)[i:i + 500])]:
+                    if values:
+                        rows += self._db.execute(
+                            f"SELECT track_id, isrc FROM downloads WHERE {column} IN "
+                            f"({','.join('?' * len(values))}){quality_filter}",
+                            values + ([quality] if quality else [])).fetchall()
+
+        indexed = set()
+        for row in rows:
+            if row[0] in track_ids:
+                indexed.add(row[0])
+            indexed |= isrcs.get(row[1], set())
+
+        return indexed
+
+    def add(self, track_id, quality: str, isrc: str, path: str, codec: str) -> str:
+        # copies the downloaded file into the store before orpheus tags and moves it, returns the stored path. A copy
+        # and not a hard link, orpheus writes the tags of this job into the file
+        extension = {"flac": ".flac", "aac": ".m4a"}.get(codec, "")
+        stored_path = os.path.join(self.store_path, f"{track_id}_{quality}{extension}")
+        if os.path.exists(stored_path):
+            # could still be a hard link of an older version, never write into it
+            os.remove(stored_path)
+        if self.max_bytes > 0:
+            shutil.copyfile(path, stored_path)
+            self._evict(stored_path)
+
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO downloads (track_id, quality, isrc, path, codec, added) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", (str(track_id), quality, isrc, stored_path, codec,
+                                                           time.time()))
+            self._db.commit()
+
+        return stored_path
+
+    def _evict(self, keep: str):
+        # delete the least recently used files until the store is below max_bytes, never the file which was just added
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.store_path):
+                if entry.is_file() and entry.path != keep:
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in files) + os.path.getsize(keep)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
@@ -0,0 +1,130 @@
+import re
+import threading
+
+from collections import Counter, defaultdict
+
+# upper bounds in seconds of the latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        # one count per bucket in LATENCY_BUCKETS plus +Inf, not cumulative
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.status_codes = Counter()
+        self.retries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class BeatportMetrics:
+    def __init__(self):
+        self.endpoints = defaultdict(EndpointMetrics)
+        self.token_refreshes = 0
+        # every hook is called with the event dict of every request and cache lookup
+        self.hooks = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def endpoint_name(endpoint: str) -> str:
+        # group the endpoints without their ids, catalog/tracks/123/download -> catalog/tracks/{id}/download
+        return re.sub(r'/\d+', '/{id}', endpoint.strip('/'))
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _emit(self, event: dict):
+        for hook in self.hooks:
+            hook(event)
+
+    def record_request(self, endpoint: str, status_code: int, latency: float, bytes_received: int,
+                       retries: int = 0):
+        endpoint = self.endpoint_name(endpoint)
+        with self._lock:
+            metrics = self.endpoints[endpoint]
+            metrics.requests += 1
+            metrics.bytes_received += bytes_received
+            metrics.latency_sum += latency
+            metrics.latency_max = max(metrics.latency_max, latency)
+            metrics.latency_buckets[next((i for i, b in enumerate(LATENCY_BUCKETS) if latency <= b),
+                                         len(LATENCY_BUCKETS))] += 1
+            metrics.status_codes[status_code] += 1
+            metrics.retries += retries
+
+        self._emit({'type': 'request', 'endpoint': endpoint, 'status_code': status_code, 'latency': latency,
+                    'bytes_received': bytes_received, 'retries': retries})
+
+    def record_cache(self, endpoint: str, hit: bool):
+        endpoint = self.endpoint_name(endpoint)
+        with self._lock:
+            if hit:
+                self.endpoints[endpoint].cache_hits += 1
+            else:
+                self.endpoints[endpoint].cache_misses += 1
+
+        self._emit({'type': 'cache', 'endpoint': endpoint, 'hit': hit})
+
+    def record_token_refresh(self):
+        with self._lock:
+            self.token_refreshes += 1
+
+        self._emit({'type': 'token_refresh'})
+
+    def summary(self) -> str:
+        lines = [f"{'endpoint':<40} {'requests':>8} {'avg ms':>8} {'max ms':>8} {'KiB':>9} {'retries':>7} "
+                 f"{'cache':>11}  status codes"]
+        with self._lock:
+            for endpoint, m in sorted(self.endpoints.items(), key=lambda e: -e[1].latency_sum):
+                avg = m.latency_sum / m.requests * 1000 if m.requests else 0
+                status_codes = ', '.join(f'{code}: {count}' for code, count in sorted(m.status_codes.items()))
+                lines.append(f"{endpoint:<40} {m.requests:>8} {avg:>8.1f} {m.latency_max * 1000:>8.1f} "
+                             f"{m.bytes_received / 1024:>9.1f} {m.retries:>7} "
+                             f"{f'{m.cache_hits}/{m.cache_hits + m.cache_misses}':>11}  {status_codes}")
+            lines.append(f"token refreshes: {self.token_refreshes}")
+
+        return '\n'.join(lines)
+
+    def prometheus(self) -> str:
+        # Prometheus text exposition format
+        lines = [
+            '# HELP beatport_requests_total Requests to the Beatport API by endpoint and status code.',
+            '# TYPE beatport_requests_total counter',
+        ]
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            for endpoint, m in endpoints:
+                for code, count in sorted(m.status_codes.items()):
+                    lines.append(f'beatport_requests_total{{endpoint="{endpoint}",code="{code}"}} {count}')
+
+            lines += ['# HELP beatport_request_duration_seconds Latency of the Beatport API requests.',
+                      '# TYPE beatport_request_duration_seconds histogram']
+            for endpoint, m in endpoints:
+                if not m.requests:
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), m.latency_buckets):
+                    cumulative += count
+                    lines.append(f'beatport_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} '
+                                 f'{cumulative}')
+                lines.append(f'beatport_request_duration_seconds_sum{{endpoint="{endpoint}"}} {m.latency_sum}')
+                lines.append(f'beatport_request_duration_seconds_count{{endpoint="{endpoint}"}} {m.requests}')
+
+            for name, attribute, help_text in [
+                ('beatport_received_bytes_total', 'bytes_received', 'Bytes received from the Beatport API.'),
+                ('beatport_retries_total', 'retries', 'Retried requests after a 429 or 5xx response.'),
+                ('beatport_cache_hits_total', 'cache_hits', 'Requests answered by the metadata cache.'),
+                ('beatport_cache_misses_total', 'cache_misses', 'Cacheable requests not in the metadata cache.'),
+            ]:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{{endpoint="{endpoint}"}} {getattr(m, attribute)}' for endpoint, m in endpoints]
+
+            lines += ['# HELP beatport_token_refreshes_total Refreshed access tokens.',
+                      '# TYPE beatport_token_refreshes_total counter',
+                      f'beatport_token_refreshes_total {self.token_refreshes}']
+
+        return '\n'.join(lines) + '\n'
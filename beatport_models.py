@@ -0,0 +1,142 @@
+import sys
+import threading
+
+from dataclasses import dataclass
+
+
+# compact versions of the v4 JSON, only with the fields get_track_info, get_album_info and get_track_cover read. The
+# nested release, label and artist objects are shared between all tracks by the BeatportRecords store
+
+
+@dataclass
+class BeatportArtist:
+    __slots__ = ("id", "name")
+    id: int
+    name: str
+
+
+@dataclass
+class BeatportLabel:
+    __slots__ = ("id", "name")
+    id: int
+    name: str
+
+
+@dataclass
+class BeatportRelease:
+    __slots__ = ("id", "name", "image_uri", "label", "artists", "upc", "track_count", "publish_date", "complete")
+    id: int
+    name: str
+    image_uri: str
+    label: BeatportLabel or None
+    artists: tuple
+    upc: str or None
+    track_count: int or None
+    publish_date: str or None
+    # False if the release was only created from the short version nested in a track
+    complete: bool
+
+
+@dataclass
+class BeatportTrack:
+    __slots__ = ("id", "name", "mix_name", "number", "isrc", "publish_date", "length_ms", "bpm", "key", "genre",
+                 "sub_genre", "catalog_number", "is_available_for_streaming", "preorder", "release", "artists")
+    id: int
+    name: str
+    mix_name: str or None
+    number: int or None
+    isrc: str or None
+    publish_date: str or None
+    length_ms: int or None
+    bpm: int or None
+    key: str or None
+    genre: str or None
+    sub_genre: str or None
+    catalog_number: str or None
+    is_available_for_streaming: bool
+    preorder: bool
+    release: BeatportRelease
+    artists: tuple
+
+
+def _intern(value: str or None) -> str or None:
+    return sys.intern(value) if value else value
+
+
+class BeatportRecords:
+    def __init__(self):
+        # shared objects by their id
+        self.releases = {}
+        self.labels = {}
+        self.artists = {}
+        self._lock = threading.Lock()
+
+    def artist(self, data: dict) -> BeatportArtist:
+        artist = self.artists.get(data.get("id"))
+        if artist is None:
+            artist = self.artists.setdefault(data.get("id"), BeatportArtist(data.get("id"), _intern(data.get("name"))))
+        return artist
+
+    def label(self, data: dict or None) -> BeatportLabel or None:
+        if not data:
+            return None
+
+        label = self.labels.get(data.get("id"))
+        if label is None:
+            label = self.labels.setdefault(data.get("id"), BeatportLabel(data.get("id"), _intern(data.get("name"))))
+        return label
+
+    def release(self, data: dict or BeatportRelease) -> BeatportRelease:
+        if isinstance(data, BeatportRelease):
+            return data
+
+        # the release nested in a track has no artists, upc or track_count
+        complete = "track_count" in data
+        with self._lock:
+            release = self.releases.get(data.get("id"))
+            if release is not None and (release.complete or not complete):
+                return release
+
+            record = BeatportRelease(
+                id=data.get("id"),
+                name=data.get("name"),
+                image_uri=(data.get("image") or {}).get("dynamic_uri"),
+                label=self.label(data.get("label")),
+                artists=tuple(self.artist(a) for a in data.get("artists") or []),
+                upc=data.get("upc"),
+                track_count=data.get("track_count"),
+                publish_date=data.get("publish_date"),
+                complete=complete
+            )
+
+            if release is None:
+                self.releases[record.id] = record
+                return record
+
+            # complete the existing record in place, all tracks already point to it
+            for field in BeatportRelease.__slots__:
+                setattr(release, field, getattr(record, field))
+            return release
+
+    def track(self, data: dict or BeatportTrack) -> BeatportTrack:
+        if isinstance(data, BeatportTrack):
+            return data
+
+        return BeatportTrack(
+            id=data.get("id"),
+            name=data.get("name"),
+            mix_name=data.get("mix_name"),
+            number=data.get("number"),
+            isrc=data.get("isrc"),
+            publish_date=data.get("publish_date"),
+            length_ms=data.get("length_ms"),
+            bpm=data.get("bpm"),
+            key=_intern((data.get("key") or {}).get("name")),
+            genre=_intern((data.get("genre") or {}).get("name")),
+            sub_genre=_intern((data.get("sub_genre") or {}).get("name")),
+            catalog_number=data.get("catalog_number"),
+            is_available_for_streaming=data.get("is_available_for_streaming"),
+            preorder=data.get("preorder"),
+            release=self.release(data.get("release")),
+            artists=tuple(self.artist(a) for a in data.get("artists") or [])
+        )
@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import re
+import time
+
+from datetime import datetime, timedelta
+
+from .beatport_api import BeatportApi, BeatportError
+
+
+class PooledSession:
+    def __init__(self, api: BeatportApi, name: str, subscription: str = None, subscription_checked: datetime = None,
+                 save=None):
+        self.api = api
+        self.name = name
+        # None until it was checked, see BeatportSessionPool.subscription()
+        self.subscription = subscription
+        self.subscription_checked = subscription_checked
+        # stores the tokens and the subscription of the additional accounts
+        self.save = save
+        # the session is not used until then after errors
+        self.ejected_until = 0.0
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+
+class BeatportSessionPool:
+    # fails over to the additional accounts while the primary account is failing or logged out. All accounts share the
+    # rate limit of the primary account, so they never send more requests than a single account. All other attributes
+    # and methods are the ones of the primary BeatportApi, so the pool can be used like a BeatportApi
+    _attributes = {"primary", "sessions", "eject_seconds", "subscription_ttl"}
+
+    def __init__(self, primary: BeatportApi, primary_subscription: str = None, eject_seconds: float = 60,
+                 subscription_ttl: timedelta = timedelta(hours=24)):
+        self.primary = primary
+        self.sessions = [PooledSession(primary, "primary", primary_subscription)]
+        self.eject_seconds = eject_seconds
+        self.subscription_ttl = subscription_ttl
+
+    def add_account(self, api: BeatportApi, username: str, password: str, session_path: str):
+        # the tokens and the subscription of every account are stored in their own file in session_path
+        path = os.path.join(session_path, re.sub(r"[^\w-]", "_", username) + ".json")
+        stored = {}
+        try:
+            with open(path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        api.set_session({
+            "access_token": stored.get("access_token"),
+            "refresh_token": stored.get("refresh_token"),
+            "expires": datetime.fromisoformat(stored["expires"]) if stored.get("expires") else None
+        })
+        api.set_credentials(username, password)
+
+        session = PooledSession(api, username)
+        if stored.get("subscription_checked"):
+            checked = datetime.fromisoformat(stored["subscription_checked"])
+            if datetime.now() - checked < self.subscription_ttl:
+                session.subscription, session.subscription_checked = stored.get("subscription"), checked
+
+        def save_session():
+            os.makedirs(session_path, exist_ok=True)
+            with open(path + ".tmp", "w") as f:
+                json.dump({
+                    "access_token": api.access_token,
+                    "refresh_token": api.refresh_token,
+                    "expires": api.expires.isoformat() if api.expires else None,
+                    "subscription": session.subscription,
+                    "subscription_checked": session.subscription_checked.isoformat()
+                    if session.subscription_checked else None,
+                }, f)
+            os.replace(path + ".tmp", path)
+
+        api.on_session_update = save_session
+        session.save = save_session
+        self.sessions.append(session)
+
+    def subscription(self, session: PooledSession) -> str:
+        # the subscription of the additional accounts is checked on their first lossless request
+        if session.subscription is None:
+            session.subscription = session.api.get_account().get("subscription") or ""
+            # only an active subscription is cached, so the next start checks again
+            if session.subscription:
+                session.subscription_checked = datetime.now()
+                if session.save:
+                    session.save()
+
+        return session.subscription
+
+    def _candidates(self, lossless: bool, exclude: set) -> list:
+        sessions = [s for s in self.sessions if s not in exclude]
+        if lossless:
+            # only Professional subscriptions are allowed to download lossless files
+            eligible = []
+            for session in sessions:
+                try:
+                    if self.subscription(session).startswith("bp_link_pro"):
+                        eligible.append(session)
+                except Exception as e:
+                    logging.debug(f"Beatport: subscription check of {session.name} failed: {e}")
+                    self._eject(session)
+            sessions = eligible
+
+        # the primary first, the ejected sessions last instead of failing
+        return [s for s in sessions if s.healthy()] + [s for s in sessions if not s.healthy()]
+
+    def _eject(self, session: PooledSession):
+        logging.debug(f"Beatport: ejecting session {session.name} for {self.eject_seconds}s")
+        session.ejected_until = time.monotonic() + self.eject_seconds
+
+    @staticmethod
+    def _failover(error: Exception) -> bool:
+        # server errors (5xx), transport errors and logged out (401, ValueError) try the next account. A 429 was already
+        # retried by the RequestScheduler shared by all accounts, and every other 4xx would fail the same way with
+        # every account
+        if isinstance(error, ValueError):
+            return True
+
+        status_code = getattr(error, "status_code", None)
+        return status_code is None or status_code >= 500
+
+    def _call(self, method: str, *args, **kwargs):
+        lossless = method == "get_track_download" and \
+            (kwargs.get("quality") or (args[1] if len(args) > 1 else None)) == "lossless"
+
+        tried = set()
+        error = None
+        while True:
+            candidates = self._candidates(lossless, tried)
+            if not candidates:
+                # every session failed
+                if error is not None:
+                    raise error
+                raise BeatportError("no account with a Professional subscription for lossless downloads")
+
+            session = candidates[0]
+            try:
+                return getattr(session.api, method)(*args, **kwargs)
+            except (OSError, ValueError) as e:
+                # ConnectionError and all requests exceptions are subclasses of OSError
+                if not self._failover(e):
+                    raise
+
+                logging.debug(f"Beatport: {method} failed with session {session.name}: {e}")
+                self._eject(session)
+                tried.add(session)
+                error = e
+
+    def __getattr__(self, name: str):
+        # the catalog and the download requests fail over to the other sessions, everything else uses the primary
+        if name.startswith("get_") and name not in {"get_account", "get_session", "get_pool_stats"}:
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+        return getattr(self.primary, name)
+
+    def __setattr__(self, name: str, value):
+        if name in self._attributes:
+            super().__setattr__(name, value)
+        else:
+            setattr(self.primary, name, value)
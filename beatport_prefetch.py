@@ -0,0 +1,88 @@
+import calendar
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+
+class DownloadUrlPrefetcher:
+    def __init__(self, resolve, depth: int = 3, workers: int = 2, default_ttl: float = 600, margin: float = 30):
+        # resolve(track_id, quality) returns the download dict with the signed "location" of a track, depth is the
+        # number of tracks after the current one which are resolved ahead of time
+        self.resolve = resolve
+        self.depth = depth
+        # used if the expiry can't be read from the signed URL, margin is subtracted from every expiry
+        self.default_ttl = default_ttl
+        self.margin = margin
+
+        # track ids in download order and their position
+        self.queue = []
+        self.positions = {}
+        # (track_id, quality) -> Future of (download dict, expires)
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="beatport-prefetch")
+
+    def set_queue(self, track_ids, append: bool = False):
+        with self._lock:
+            if not append:
+                self.queue = []
+                self.positions = {}
+                # the prefetched URLs of the previous queue are not needed anymore
+                for key in [k for k in self._futures if k[0] not in {str(t) for t in track_ids}]:
+                    self._futures.pop(key).cancel()
+
+            for track_id in track_ids:
+                self.positions[str(track_id)] = len(self.queue)
+                self.queue.append(str(track_id))
+
+    def _expires(self, location: str) -> float:
+        # CloudFront signed URLs have an Expires epoch, S3 presigned URLs X-Amz-Date and X-Amz-Expires
+        params = parse_qs(urlparse(location).query)
+        try:
+            if "Expires" in params:
+                return float(params["Expires"][0]) - self.margin
+            if "X-Amz-Date" in params and "X-Amz-Expires" in params:
+                signed = calendar.timegm(time.strptime(params["X-Amz-Date"][0], "%Y%m%dT%H%M%SZ"))
+                return signed + float(params["X-Amz-Expires"][0]) - self.margin
+        except ValueError:
+            pass
+
+        return time.time() + self.default_ttl - self.margin
+
+    def _resolve(self, track_id: str, quality: str) -> tuple:
+        download = self.resolve(track_id, quality)
+        return download, self._expires(download.get("location") or "")
+
+    def get(self, track_id, quality: str) -> dict:
+        track_id = str(track_id)
+        with self._lock:
+            future = self._futures.pop((track_id, quality), None)
+
+        download = None
+        if future is not None and not future.cancelled():
+            try:
+                download, expires = future.result()
+                # resolve it again if it went stale while waiting in the queue
+                if time.time() >= expires:
+                    download = None
+            except Exception:
+                # resolve it again synchronously, so the actual error is raised to the caller
+                download = None
+
+        if download is None:
+            download, _ = self._resolve(track_id, quality)
+
+        self._prefetch_after(track_id, quality)
+        return download
+
+    def _prefetch_after(self, track_id: str, quality: str):
+        with self._lock:
+            position = self.positions.get(track_id)
+            if position is None:
+                return
+
+            for next_id in self.queue[position + 1:position + 1 + self.depth]:
+                if (next_id, quality) not in self._futures:
+                    self._futures[(next_id, quality)] = self._executor.submit(self._resolve, next_id, quality)
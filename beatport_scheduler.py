@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# lower values are served first, metadata requests should never wait behind the download URL resolutions
+PRIORITY_METADATA = 0
+PRIORITY_DOWNLOAD = 1
+
+
+class RequestScheduler:
+    def __init__(self, rate: float = 10, burst: int = 20):
+        # rate = 0 disables the token bucket, Retry-After and the rate limit headers are honoured anyway
+        self.rate = rate
+        self.burst = max(1, burst)
+
+        # adaptive rate, halved on every 429 and slowly increased back to rate on every successful response
+        self.current_rate = rate
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        # all requests are paused until this time after a 429 or an exhausted rate limit
+        self.blocked_until = 0.0
+
+        self.waiting = {PRIORITY_METADATA: 0, PRIORITY_DOWNLOAD: 0}
+        # number of 429 responses in a row
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if self.current_rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.current_rate)
+        self.updated = now
+
+    def try_acquire(self, priority: int = PRIORITY_METADATA) -> float:
+        # returns 0 if the request may be sent now, otherwise the seconds to wait before trying again
+        with self._lock:
+            now = time.monotonic()
+            if self.blocked_until > now:
+                return self.blocked_until - now
+
+            if not self.rate:
+                return 0
+
+            # let waiting requests with a higher priority go first
+            if any(count for p, count in self.waiting.items() if p < priority):
+                return 1 / self.current_rate
+
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            return (1 - self.tokens) / self.current_rate
+
+    def acquire(self, priority: int = PRIORITY_METADATA):
+        with self._lock:
+            self.waiting[priority] += 1
+
+        try:
+            while True:
+                delay = self.try_acquire(priority)
+                if not delay:
+                    return
+                time.sleep(delay)
+        finally:
+            with self._lock:
+                self.waiting[priority] -= 1
+
+    async def acquire_async(self, priority: int = PRIORITY_METADATA):
+        # same as acquire() but without blocking the event loop
+        with self._lock:
+            self.waiting[priority] += 1
+
+        try:
+            while True:
+                delay = self.try_acquire(priority)
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            with self._lock:
+                self.waiting[priority] -= 1
+
+    @staticmethod
+    def _parse_retry_after(value: str) -> float or None:
+        # Retry-After is either the number of seconds or a HTTP date
+        if not value:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _parse_rate_limit_reset(headers) -> float or None:
+        remaining = headers.get('X-RateLimit-Remaining', headers.get('RateLimit-Remaining'))
+        reset = headers.get('X-RateLimit-Reset', headers.get('RateLimit-Reset'))
+        if remaining is None or reset is None:
+            return None
+
+        try:
+            if int(float(remaining)) > 0:
+                return None
+            reset = float(reset)
+        except ValueError:
+            return None
+
+        # the reset is either an epoch timestamp or the seconds until the limit resets
+        return max(0.0, reset - time.time()) if reset > 1e9 else reset
+
+    def _block(self, delay: float):
+        # called with the lock held
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    def update(self, status_code: int, headers) -> float:
+        # returns the seconds to wait before a throttled request should be retried, 0 if it wasn't throttled
+        with self._lock:
+            reset = self._parse_rate_limit_reset(headers)
+            if reset:
+                self._block(reset)
+
+            if status_code != 429:
+                self.throttled = 0
+                # additive increase back to the configured rate
+                if self.rate and self.current_rate < self.rate:
+                    self.current_rate = min(self.rate, self.current_rate + self.rate / 20)
+                return 0
+
+            # multiplicative decrease, never go below a tenth of the configured rate
+            self.throttled += 1
+            if self.rate:
+                self.current_rate = max(self.rate / 10, self.current_rate / 2)
+                self.tokens = 0
+
+            delay = self._parse_retry_after(headers.get('Retry-After'))
+            if delay is None:
+                # no hint from the server, back off exponentially with the number of throttled requests in a row
+                delay = reset or min(60.0, 2 ** min(self.throttled, 6) / 2)
+            self._block(delay)
+
+            # a throttled request is always retried, also with "Retry-After: 0"
+            return max(delay, 0.001)
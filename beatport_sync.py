@@ -0,0 +1,43 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class SyncSnapshot:
+    def __init__(self, modified: str or None, track_ids: set, synced: float):
+        self.modified = modified
+        self.track_ids = track_ids
+        self.synced = synced
+
+
+class SyncSnapshots:
+    def __init__(self, path: str):
+        # the last synced state of every chart, playlist and artist: its modification date and all known track ids
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS snapshots ("
+                         "collection TEXT PRIMARY KEY, "
+                         "modified TEXT, "
+                         "track_ids TEXT NOT NULL, "
+                         "synced REAL NOT NULL)")
+        self._db.commit()
+
+    def get(self, collection: str) -> SyncSnapshot or None:
+        with self._lock:
+            row = self._db.execute("SELECT modified, track_ids, synced FROM snapshots WHERE collection = ?",
+                                   (collection,)).fetchone()
+
+        if row is None:
+            return None
+
+        return SyncSnapshot(row[0], set(json.loads(row[1])), row[2])
+
+    def save(self, collection: str, modified: str or None, track_ids: set):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO snapshots (collection, modified, track_ids, synced) "
+                             "VALUES (?, ?, ?, ?)",
+                             (collection, modified, json.dumps(sorted(str(t) for t in track_ids)), time.time()))
+            self._db.commit()
@@ -0,0 +1,95 @@
+"""
+Offline benchmarks of the Beatport module against a local stand-in for api.beatport.com/v4, run from the orpheusdl/
+directory with:
+
+    python -m modules.beatport.benchmarks.bench --sizes 100,1000,5000 --latency 0.05
+"""
+
+import argparse
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from utils.models import QualityEnum
+from ..interface import ModuleInterface
+from .mock_server import MockBeatportServer, MockBeatportConfig
+
+
+def create_module(server: MockBeatportServer, data_dir: str, settings: dict) -> ModuleInterface:
+    # a logged in module without subscription check, so the constructor doesn't send any request
+    storage = {"access_token": "mock", "refresh_token": "mock", "expires": datetime.now() + timedelta(hours=10)}
+    module_controller = SimpleNamespace(
+        module_error=Exception,
+        orpheus_options=SimpleNamespace(disable_subscription_check=True,
+                                        default_cover_options=SimpleNamespace(resolution=1400)),
+        printer_controller=SimpleNamespace(oprint=lambda *args, **kwargs: None),
+        temporary_settings_controller=SimpleNamespace(read=storage.get, set=storage.__setitem__),
+        module_settings={"username": "mock", "password": "mock", "data_dir": data_dir, "cache_enabled": False,
+                         **settings},
+    )
+
+    module = ModuleInterface(module_controller)
+    module.session.API_URL = server.api_url
+    return module
+
+
+def scenarios(track_info_count: int) -> dict:
+    def track_info(module: ModuleInterface):
+        # resolve every track on its own, without the data of a listing
+        playlist = module.get_playlist_info("1")
+        for track_id in playlist.tracks[:track_info_count]:
+            module.get_track_info(str(track_id), QualityEnum.HIGH, None)
+
+    def listing_track_info(module: ModuleInterface):
+        # what orpheus does after get_playlist_info(), should not need any additional request
+        playlist = module.get_playlist_info("1")
+        for track_id in playlist.tracks:
+            module.get_track_info(track_id, QualityEnum.HIGH, None, **playlist.track_extra_kwargs)
+
+    return {
+        "get_playlist_info": lambda module: module.get_playlist_info("1"),
+        "get_playlist_info (chart)": lambda module: module.get_playlist_info("2", is_chart=True),
+        "get_album_info": lambda module: module.get_album_info("3"),
+        "get_artist_info": lambda module: module.get_artist_info("4", get_credited_albums=False),
+        "playlist + get_track_info": listing_track_info,
+        f"get_track_info x{track_info_count}": track_info,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Beatport module against a local mock server")
+    parser.add_argument("--sizes", default="100,1000,5000", help="comma separated playlist/chart/artist sizes")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds every mock response is delayed")
+    parser.add_argument("--throttle-every", type=int, default=0, help="return a 429 every n requests, 0 = never")
+    parser.add_argument("--track-info-count", type=int, default=50, help="tracks resolved one by one")
+    parser.add_argument("--page-workers", type=int, default=4)
+    parser.add_argument("--async-bulk", action="store_true", help="use httpx for bulk lookups")
+    args = parser.parse_args()
+
+    settings = {"page_workers": args.page_workers, "async_bulk": args.async_bulk}
+    server = MockBeatportServer(MockBeatportConfig(latency=args.latency, throttle_every=args.throttle_every)).start()
+
+    print(f"{'scenario':<30} {'size':>6} {'seconds':>9} {'requests':>9} {'429s':>6}")
+    try:
+        with tempfile.TemporaryDirectory() as data_dir:
+            for size in [int(s) for s in args.sizes.split(",")]:
+                server.config.collection_size = size
+                for name, scenario in scenarios(args.track_info_count).items():
+                    # a new module for every scenario, so nothing is reused from the previous one
+                    module = create_module(server, data_dir, settings)
+                    server.reset_counts()
+
+                    start = time.perf_counter()
+                    scenario(module)
+                    elapsed = time.perf_counter() - start
+
+                    print(f"{name:<30} {size:>6} {elapsed:>9.3f} {sum(server.requests.values()):>9} "
+                          f"{server.throttled:>6}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
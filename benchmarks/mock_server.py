@@ -0,0 +1,215 @@
+import json
+import re
+import threading
+import time
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# every release has RELEASE_SIZE tracks, track ids are derived from the collection id so all responses are stable
+RELEASE_SIZE = 10
+IMAGE_URI = "https://geo-media.beatport.com/image_size/{w}x{h}/00000000-0000-0000-0000-000000000000.jpg"
+
+
+class MockBeatportConfig:
+    def __init__(self, latency: float = 0.05, collection_size: int = 500, throttle_every: int = 0,
+                 retry_after: float = 0.1):
+        # seconds every response is delayed, number of tracks of every playlist, chart and artist and every how many
+        # requests a 429 is returned (0 = never)
+        self.latency = latency
+        self.collection_size = collection_size
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+
+
+def _artist(artist_id: int) -> dict:
+    return {"id": artist_id, "name": f"Artist {artist_id}", "slug": f"artist-{artist_id}",
+            "image": {"id": artist_id, "uri": IMAGE_URI, "dynamic_uri": IMAGE_URI}}
+
+
+def _label(label_id: int) -> dict:
+    return {"id": label_id, "name": f"Label {label_id}", "slug": f"label-{label_id}",
+            "image": {"id": label_id, "uri": IMAGE_URI, "dynamic_uri": IMAGE_URI}}
+
+
+def _short_release(release_id: int) -> dict:
+    return {"id": release_id, "name": f"Release {release_id}", "slug": f"release-{release_id}",
+            "image": {"id": release_id, "uri": IMAGE_URI, "dynamic_uri": IMAGE_URI},
+            "label": _label(release_id % 50)}
+
+
+def release(release_id: int) -> dict:
+    return {**_short_release(release_id), "artists": [_artist(release_id % 200)], "upc": f"{release_id:012d}",
+            "track_count": RELEASE_SIZE, "publish_date": "2024-01-01", "catalog_number": f"CAT{release_id}",
+            "preorder": False}
+
+
+def track(track_id: int) -> dict:
+    return {"id": track_id, "name": f"Track {track_id}", "mix_name": "Original Mix", "slug": f"track-{track_id}",
+            "number": track_id % RELEASE_SIZE + 1, "isrc": f"XX0000{track_id:07d}", "publish_date": "2024-01-01",
+            "length_ms": 360000, "bpm": 126, "key": {"id": 1, "name": "A Minor"},
+            "genre": {"id": 6, "name": "Techno (Peak Time / Driving)"}, "sub_genre": None,
+            "catalog_number": f"CAT{track_id // RELEASE_SIZE}", "is_available_for_streaming": True,
+            "preorder": False, "release": _short_release(track_id // RELEASE_SIZE),
+            "artists": [_artist(track_id % 200)], "remixers": [], "exclusive": False}
+
+
+def _page(count: int, item, params: dict) -> dict:
+    # only build the items of the requested page, item(i) returns the i-th item of the listing
+    page = int(params.get("page", ["1"])[0])
+    per_page = int(params.get("per_page", ["10"])[0])
+    return {"count": count, "page": f"{page}/{max(count - 1, 0) // per_page + 1}", "per_page": per_page,
+            "results": [item(i) for i in range((page - 1) * per_page, min(page * per_page, count))]}
+
+
+class MockBeatportHandler(BaseHTTPRequestHandler):
+    server: "MockBeatportServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict = None, headers: dict = None):
+        data = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method: str):
+        url = urlparse(self.path)
+        endpoint = url.path.removeprefix("/v4/").strip("/")
+        params = parse_qs(url.query)
+        if method == "POST":
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        config = self.server.config
+        time.sleep(config.latency)
+        if self.server.count(method, endpoint) and endpoint.startswith("catalog"):
+            self._send(429, {"detail": "Request was throttled."}, {"Retry-After": str(config.retry_after)})
+            return
+
+        # authentication
+        if endpoint == "auth/o/authorize":
+            self._send(302, headers={"Location": "seratodjlite://beatport?code=mock"})
+        elif endpoint == "auth/login":
+            self._send(200, {"username": "mock"})
+        elif endpoint == "auth/o/token":
+            self._send(200, {"access_token": "mock", "refresh_token": "mock", "expires_in": 36000})
+        elif endpoint == "auth/o/introspect":
+            self._send(200, {"subscription": "bp_link_pro"})
+        else:
+            body = self._catalog(endpoint, params)
+            if body is None:
+                self._send(404, {"detail": "Not found."})
+            else:
+                self._send(200, body)
+
+    def _catalog(self, endpoint: str, params: dict) -> dict or None:
+        size = self.server.config.collection_size
+        parts = endpoint.split("/")[1:]
+        if not parts:
+            return None
+
+        kind, rest = parts[0], parts[1:]
+        if kind == "search":
+            return {"tracks": [track(i) for i in range(10)], "releases": [release(i) for i in range(10)],
+                    "charts": [], "artists": [_artist(i) for i in range(10)]}
+
+        # multi id filter
+        if not rest:
+            ids = [int(i) for i in params.get("id", [""])[0].split(",") if i]
+            if kind == "tracks":
+                return _page(len(ids), lambda i: track(ids[i]), params)
+            if kind == "releases":
+                return _page(len(ids), lambda i: release(ids[i]), params)
+            return None
+
+        item_id = int(rest[0])
+        # the tracks of a playlist, chart or artist are numbered from item_id * 100000
+        collection_track = lambda i: track(item_id * 100000 + i)
+        if kind == "tracks":
+            if rest[1:] == ["download"]:
+                return {"location": f"https://mock.beatport.com/{item_id}.flac?Expires={int(time.time()) + 600}",
+                        "stream_quality": ".flac"}
+            if rest[1:] == ["stream"]:
+                return {"stream_url": f"https://mock.beatport.com/{item_id}.m3u8"}
+            return track(item_id)
+        if kind == "releases":
+            if rest[1:] == ["tracks"]:
+                return _page(RELEASE_SIZE, lambda i: track(item_id * RELEASE_SIZE + i), params)
+            return release(item_id)
+        if kind == "playlists":
+            if rest[1:] == ["tracks"]:
+                return _page(size, lambda i: {"id": i, "track": collection_track(i)}, params)
+            return {"id": item_id, "name": f"Playlist {item_id}", "updated_date": "2024-01-01T00:00:00",
+                    "release_images": [IMAGE_URI], "track_count": size}
+        if kind == "charts":
+            if rest[1:] == ["tracks"]:
+                return _page(size, collection_track, params)
+            return {"id": item_id, "name": f"Chart {item_id}", "change_date": "2024-01-01T00:00:00",
+                    "image": {"id": item_id, "dynamic_uri": IMAGE_URI}, "person": {"owner_name": "Mock"},
+                    "track_count": size}
+        if kind == "artists":
+            if rest[1:] == ["tracks"]:
+                return _page(size, collection_track, params)
+            return _artist(item_id)
+        if kind == "genres":
+            if rest[1:] == ["top", "100"]:
+                return _page(min(size, 100), collection_track, params)
+            return {"id": item_id, "name": f"Genre {item_id}"}
+        if kind == "labels":
+            if rest[1:] == ["releases"]:
+                return _page(size // RELEASE_SIZE, lambda i: release(item_id * 100000 + i), params)
+            return _label(item_id)
+        return None
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class MockBeatportServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: MockBeatportConfig = None, port: int = 0):
+        super().__init__(("127.0.0.1", port), MockBeatportHandler)
+        self.config = config or MockBeatportConfig()
+        self.requests = Counter()
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def api_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v4/"
+
+    def count(self, method: str, endpoint: str) -> bool:
+        # counts the request by its endpoint without ids, returns True if the request should be throttled
+        endpoint = re.sub(r"/\d+", "/{id}", endpoint)
+        with self._lock:
+            self.requests[f"{method} {endpoint}"] += 1
+            total = sum(self.requests.values())
+            if self.config.throttle_every and total % self.config.throttle_every == 0:
+                self.throttled += 1
+                return True
+        return False
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+            self.throttled = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
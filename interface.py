@@ -1,24 +1,108 @@
+import atexit
 import logging
+import os
 import re
+import shutil
+import sys
+import threading
+import time
 
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
 
 from utils.models import *
 from utils.models import AlbumInfo
+from utils.utils import create_temp_filename
 from .beatport_api import BeatportApi, BeatportError
+from .beatport_artwork import ArtworkCache
+from .beatport_async import BulkBeatportApi, httpx
+from .beatport_cache import BeatportCache
+from .beatport_coordination import WorkQueue
+from .beatport_download import RangedDownloader, JobManifests
+from .beatport_hls import HlsDownloader
+from .beatport_index import DownloadIndex
+from .beatport_models import BeatportRecords, BeatportRelease
+from .beatport_pool import BeatportSessionPool
+from .beatport_prefetch import DownloadUrlPrefetcher
+from .beatport_scheduler import RequestScheduler
+from .beatport_sync import SyncSnapshots
 
 module_information = ModuleInformation(
     service_name="Beatport",
     module_supported_modes=ModuleModes.download | ModuleModes.covers,
     login_behaviour=ManualEnum.manual,
+    global_settings={
+        "page_workers": 4,
+        "data_dir": "",
+        "cache_enabled": True,
+        "cache_max_entries": 50000,
+        "pool_size": 10,
+        "max_retries": 3,
+        "backoff_factor": 0.5,
+        "timeout": 30,
+        "rate_limit": 10,
+        "rate_limit_burst": 20,
+        "rate_limit_retries": 5,
+        "async_bulk": False,
+        "async_concurrency": 20,
+        "metrics_summary": False,
+        "metrics_prometheus_file": "",
+        "download_prefetch": 3,
+        "ranged_downloads": False,
+        "download_connections": 4,
+        "download_chunk_size_mb": 8,
+        "resume_downloads": False,
+        "incremental_sync": False,
+        "search_cache_size": 256,
+        "artwork_cache": False,
+        "artwork_cache_size_mb": 512,
+        "subscription_cache_hours": 24,
+        "download_mode": "download",
+        "stream_workers": 4,
+        "coordination_db": "",
+        "node_id": "",
+        "coordination_lease_seconds": 600,
+        "download_index": False,
+        "download_index_skip": False,
+        "download_index_size_mb": 2048,
+        "accounts": [],
+        "account_eject_seconds": 60
+    },
     session_settings={"username": "", "password": ""},
-    session_storage_variables=["access_token", "refresh_token", "expires"],
+    session_storage_variables=["access_token", "refresh_token", "expires", "subscription", "quality_parse",
+                               "subscription_checked"],
     netlocation_constant="beatport",
     url_decoding=ManualEnum.manual,
     test_url="https://www.beatport.com/track/darkside/10844269"
 )
 
 
+# locale prefixed URLs like beatport.com/de/track/... or beatport.com/pt-br/track/... are supported as well
+URL_PATTERN = re.compile(r"https?://(?:www\.)?beatport\.com/(?:[a-z]{2}(?:-[a-z]{2})?/)?.*?"
+                         r"(?P<type>track|release|artist|label|playlists|chart|genre)/[^/]+/(?P<id>\d+)")
+ARTWORK_RESOLUTION_PATTERN = re.compile(r"\d{3,4}x\d{3,4}")
+
+# parse the URL "type" to the actual DownloadTypeEnum, a label discography is handled like an artist and the top 100 of
+# a genre like a playlist
+URL_MEDIA_TYPES = {
+    "track": DownloadTypeEnum.track,
+    "release": DownloadTypeEnum.album,
+    "artist": DownloadTypeEnum.artist,
+    "label": DownloadTypeEnum.artist,
+    "playlists": DownloadTypeEnum.playlist,
+    "chart": DownloadTypeEnum.playlist,
+    "genre": DownloadTypeEnum.playlist
+}
+
+
+@lru_cache(maxsize=4096)
+def artwork_template(cover_url: str) -> str:
+    # check if it's a dynamic_uri, if not make it one by replacing the hardcoded resolution with a dynamic one
+    return ARTWORK_RESOLUTION_PATTERN.sub("{w}x{h}", cover_url)
+
+
 class ModuleInterface:
     # noinspection PyTypeChecker
     def __init__(self, module_controller: ModuleController):
@@ -28,6 +112,7 @@ class ModuleInterface:
         self.print = module_controller.printer_controller.oprint
         self.module_controller = module_controller
         self.cover_size = module_controller.orpheus_options.default_cover_options.resolution
+        self.page_workers = max(1, int(self._setting("page_workers")))
 
         # MINIMUM-MEDIUM = 128kbit/s AAC, HIGH = 256kbit/s AAC, LOSSLESS-HIFI = FLAC 44.1/16
         self.quality_parse = {
@@ -39,7 +124,128 @@ class ModuleInterface:
             QualityEnum.HIFI: "medium"
         }
 
-        self.session = BeatportApi()
+        # everything persistent (cache, ...) lives in data_dir, defaults to modules/beatport/data/
+        self.data_dir = self._setting("data_dir") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+        cache = None
+        if self._setting("cache_enabled"):
+            cache = BeatportCache(os.path.join(self.data_dir, "cache.sqlite"),
+                                  max_entries=int(self._setting("cache_max_entries")))
+
+        self.session = self._create_api(cache)
+
+        # additional accounts, the catalog and download requests fail over to them while the primary account is
+        # failing or logged out. They share the rate limit of the primary account
+        if self._setting("accounts"):
+            self.session = BeatportSessionPool(
+                self.session, primary_subscription=module_controller.temporary_settings_controller.read("subscription"),
+                eject_seconds=float(self._setting("account_eject_seconds")),
+                subscription_ttl=timedelta(hours=float(self._setting("subscription_cache_hours"))))
+            for account in self._setting("accounts"):
+                self.session.add_account(self._create_api(cache, metrics=self.session.metrics,
+                                                          scheduler=self.session.scheduler),
+                                         account.get("username"), account.get("password"),
+                                         os.path.join(self.data_dir, "accounts"))
+
+        # dump the request metrics once orpheus is done
+        if self._setting("metrics_summary") or self._setting("metrics_prometheus_file"):
+            atexit.register(self.dump_metrics)
+
+        # bulk lookups go through the AsyncBeatportApi if enabled and httpx is installed, otherwise a thread pool
+        self.bulk = None
+        if self._setting("async_bulk"):
+            if httpx is not None:
+                self.bulk = BulkBeatportApi(self.session, max_concurrency=int(self._setting("async_concurrency")))
+            else:
+                self.print("Beatport: httpx is not installed, falling back to threads for bulk lookups")
+
+        # "download" uses the download endpoint, "stream" the 128k AAC HLS stream of every track and "auto" falls back
+        # to the stream if the download endpoint fails for AAC qualities
+        self.download_mode = self._setting("download_mode")
+        if self.download_mode not in {"download", "stream", "auto"}:
+            raise self.exception(f"Beatport: download_mode '{self.download_mode}' is not supported")
+        self.hls = None
+        if self.download_mode != "download":
+            self.hls = HlsDownloader(workers=int(self._setting("stream_workers")),
+                                     timeout=float(self._setting("timeout")))
+
+        # resolve the download URLs of the next tracks while the current one is downloaded. Not with a work queue, the
+        # next tracks are usually claimed by other nodes
+        self.prefetcher = None
+        if self.download_mode != "stream" and int(self._setting("download_prefetch")) > 0 and \
+                not self._setting("coordination_db"):
+            self.prefetcher = DownloadUrlPrefetcher(self.session.get_track_download,
+                                                    depth=int(self._setting("download_prefetch")))
+
+        # download lossless files with concurrent range requests instead of a single connection, resumable downloads
+        # use range requests for every quality, with a single connection unless ranged_downloads is enabled
+        self.downloader = None
+        self.ranged_downloads = self._setting("ranged_downloads")
+        if self.ranged_downloads or self._setting("resume_downloads"):
+            chunk_size = int(float(self._setting("download_chunk_size_mb")) * 1024 * 1024)
+            connections = int(self._setting("download_connections")) if self.ranged_downloads else 1
+            self.downloader = RangedDownloader(connections=connections, chunk_size=chunk_size,
+                                               timeout=float(self._setting("timeout")))
+
+        # every completed download is indexed and copied into data_dir/downloads up to download_index_size_mb,
+        # duplicates in other jobs are copied from there, or skipped while expanding the collections with
+        # download_index_skip
+        self.download_index = None
+        self.download_index_skip = False
+        if self._setting("download_index"):
+            self.download_index = DownloadIndex(
+                os.path.join(self.data_dir, "downloads.sqlite"), os.path.join(self.data_dir, "downloads"),
+                max_bytes=int(float(self._setting("download_index_size_mb")) * 1024 * 1024))
+            self.download_index_skip = self._setting("download_index_skip")
+            if self.downloader is None:
+                self.downloader = RangedDownloader(connections=1, timeout=float(self._setting("timeout")))
+
+        # .part files of interrupted downloads and a manifest of the completed tracks of every job
+        self.manifests = None
+        self.track_jobs = {}
+        # the track orpheus is working on, it's completed once orpheus asks for the next one or once the run ends, see
+        # _complete_track() and _finish_run()
+        self.pending_track = None
+        if self._setting("resume_downloads"):
+            self.manifests = JobManifests(os.path.join(self.data_dir, "jobs"))
+        atexit.register(self._finish_run)
+
+        # only return the new tracks of charts, playlists and artists since the last sync
+        self.snapshots = None
+        # collection -> [modified, all track ids of the new snapshot, track ids which still have to be completed], the
+        # snapshot is only saved once all its new tracks are completed, so an interrupted sync is repeated
+        self.sync_pending = {}
+        self.sync_tracks = {}
+        if self._setting("incremental_sync"):
+            self.snapshots = SyncSnapshots(os.path.join(self.data_dir, "sync.sqlite"))
+
+        # several nodes share the expanded collections and claim their tracks from one work queue
+        self.work_queue = None
+        # track id -> job of the queued tracks, a track is claimed in get_track_info() and completed with the manifests
+        self.queued_tracks = {}
+        self.claimed_tracks = {}
+        if self._setting("coordination_db"):
+            self.work_queue = WorkQueue(self._setting("coordination_db"), node_id=self._setting("node_id") or None,
+                                        lease_seconds=float(self._setting("coordination_lease_seconds")))
+
+        # normalized query -> (per_page, full search response with all types), least recently used first
+        self.search_cache = OrderedDict()
+        self.search_cache_size = self._setting("search_cache_size")
+        self._search_lock = threading.Lock()
+
+        # download every release cover only once per resolution, instead of once per track
+        self.artwork = None
+        if self._setting("artwork_cache"):
+            self.artwork = ArtworkCache(os.path.join(self.data_dir, "artwork"),
+                                        max_bytes=int(float(self._setting("artwork_cache_size_mb")) * 1024 * 1024),
+                                        timeout=float(self._setting("timeout")))
+
+        # compact records of all tracks, releases, labels and artists instead of the raw JSON
+        self.records = BeatportRecords()
+        # in-process release memo {str(release_id): BeatportRelease} shared by get_album_info, get_track_info and
+        # get_track_cover, failed lookups are stored as the raised exception so a region locked release is only
+        # requested once
+        self.releases = {}
         session = {
             "access_token": module_controller.temporary_settings_controller.read("access_token"),
             "refresh_token": module_controller.temporary_settings_controller.read("refresh_token"),
@@ -47,17 +253,297 @@ class ModuleInterface:
         }
 
         self.session.set_session(session)
+        self.session.set_credentials(module_controller.module_settings["username"],
+                                     module_controller.module_settings["password"])
+        # also save the tokens which are refreshed in the background or after a 401
+        self.session.on_session_update = self._save_session
+
+        # without a session (or with an old cookie session without refresh token) BeatportApi logs in on the first
+        # request and an expired access_token is refreshed on the first request as well, so the constructor doesn't
+        # need any request as long as the cached subscription is still valid
+        self.valid_account()
 
-        if session["refresh_token"] is None:
-            # old beatport version with cookies and no refresh token, trigger login manually
-            session = self.login(module_controller.module_settings["username"],
-                                 module_controller.module_settings["password"])
+    def dump_metrics(self):
+        if self._setting("metrics_summary"):
+            pool_stats = self.session.get_pool_stats()
+            self.print(f"Beatport: request metrics\n{self.session.metrics.summary()}\n"
+                       f"connections: {pool_stats['new_connections']} new, "
+                       f"{pool_stats['reused_connections']} reused")
+
+        if self._setting("metrics_prometheus_file"):
+            with open(self._setting("metrics_prometheus_file"), "w") as f:
+                f.write(self.session.metrics.prometheus())
+
+    def _create_api(self, cache: BeatportCache = None, metrics=None, scheduler: RequestScheduler = None) -> BeatportApi:
+        # every account has its own BeatportApi, the cache, the metrics and the rate limit are shared
+        return BeatportApi(cache=cache,
+                           pool_size=max(int(self._setting("pool_size")), self.page_workers),
+                           max_retries=int(self._setting("max_retries")),
+                           backoff_factor=float(self._setting("backoff_factor")),
+                           timeout=float(self._setting("timeout")),
+                           scheduler=scheduler or RequestScheduler(rate=float(self._setting("rate_limit")),
+                                                                   burst=int(self._setting("rate_limit_burst"))),
+                           rate_limit_retries=int(self._setting("rate_limit_retries")),
+                           metrics=metrics)
+
+    def _setting(self, name: str):
+        # fall back to the module defaults if the settings.json was not updated yet
+        return self.module_controller.module_settings.get(name, module_information.global_settings[name])
+
+    def _fetch_pages(self, fetch_page, first_page: dict, per_page: int = 100) -> list:
+        # use the count of the first page to request all remaining pages concurrently
+        results = list(first_page.get("results"))
+        total_items = first_page.get("count") or 0
+        pages = range(2, (total_items - 1) // per_page + 2)
+        if not pages:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.page_workers, len(pages))) as executor:
+            futures = [executor.submit(fetch_page, page) for page in pages]
+            # executor.map would also keep the order, but this allows printing the progress
+            for future in futures:
+                print(f"Fetching {len(results)}/{total_items}", end="\r")
+                results += future.result().get("results")
+
+        return results
+
+    def _bulk_call(self, method: str, args_list: list) -> list:
+        # call the BeatportApi method for every args tuple concurrently, exceptions are returned instead of raised
+        if not args_list:
+            return []
+
+        if self.bulk is not None:
+            return self.bulk.map(method, args_list)
+
+        def call(args):
+            try:
+                return getattr(self.session, method)(*args)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=min(self.page_workers, len(args_list))) as executor:
+            return list(executor.map(call, args_list))
+
+    def _get_release(self, release_id) -> BeatportRelease:
+        release_id = str(release_id)
+        if release_id not in self.releases:
+            try:
+                self.releases[release_id] = self.records.release(self.session.get_release(release_id))
+            except (BeatportError, ConnectionError) as e:
+                if not self._permanent_error(e):
+                    raise
+                self.releases[release_id] = e
+
+        release = self.releases[release_id]
+        if isinstance(release, Exception):
+            raise release
+
+        return release
+
+    def _prefetch_releases(self, tracks: list):
+        # collect all distinct releases of the tracks which are not in the memo yet
+        release_ids = list({str(t.get("release").get("id")) for t in tracks} - self.releases.keys())
+        if not release_ids:
+            return
 
-        if session["refresh_token"] is not None and datetime.now() > session["expires"]:
-            # access token expired, get new refresh token
-            self.refresh_login()
+        releases = self._bulk_resolve("get_releases", "get_release", release_ids)
+        for release_id in release_ids:
+            release = releases.get(release_id)
+            if isinstance(release, dict):
+                self.releases[release_id] = self.records.release(release)
+            elif isinstance(release, (BeatportError, ConnectionError)) and self._permanent_error(release):
+                # errors are memorized as well, get_track_info will report them for the affected tracks
+                self.releases[release_id] = release
 
-        self.valid_account()
+    @staticmethod
+    def _permanent_error(error: Exception) -> bool:
+        # region locked or missing releases are memorized, throttled, server and network errors are tried again
+        return isinstance(error, BeatportError) or getattr(error, "status_code", None) in {403, 404}
+
+    def _bulk_resolve(self, list_method: str, single_method: str, ids: list, per_page: int = 100) -> dict:
+        # resolve the ids with the multi id filter of the catalog, everything missing from those results is requested
+        # one by one. Returns {str(id): data or exception}
+        ids = list(dict.fromkeys(str(i) for i in ids))
+        chunks = [ids[i:i + per_page] for i in range(0, len(ids), per_page)]
+
+        resolved = {}
+        for chunk, page in zip(chunks, self._bulk_call(list_method, [(c, 1, per_page) for c in chunks])):
+            if isinstance(page, Exception):
+                continue
+
+            # only trust the ids which were requested, in case the filter is ignored
+            for item in page.get("results", []):
+                if str(item.get("id")) in chunk:
+                    resolved[str(item.get("id"))] = item
+
+        missing = [i for i in ids if i not in resolved]
+        if missing:
+            resolved.update(zip(missing, self._bulk_call(single_method, [(i,) for i in missing])))
+
+        return resolved
+
+    def resolve_tracks(self, media_identifications: list) -> dict:
+        # bulk resolution for multi URL and list file jobs: deduplicates all tracks, fetches them and their releases
+        # concurrently and stores them in the extra_kwargs, so get_track_info doesn't need any request afterwards
+        track_ids = [m.media_id for m in media_identifications if m.media_type is DownloadTypeEnum.track]
+        tracks = {i: t for i, t in self._bulk_resolve("get_tracks", "get_track", track_ids).items()
+                  if isinstance(t, dict)}
+        self._prefetch_releases(list(tracks.values()))
+
+        resolved = {}
+        for track_id, track in tracks.items():
+            # the release is shared with the memo, get_track_info will find it there
+            resolved[track_id] = {track_id: self.records.track(track)}
+
+        for media in media_identifications:
+            if media.media_type is DownloadTypeEnum.track and str(media.media_id) in resolved:
+                if media.extra_kwargs is None:
+                    media.extra_kwargs = {}
+                media.extra_kwargs["data"] = resolved[str(media.media_id)]
+
+        return resolved
+
+    def _skip_indexed(self, tracks: list) -> list:
+        # skip the tracks which were already downloaded by any job, before any metadata or download request
+        if not self.download_index_skip:
+            return tracks
+
+        quality_tier = getattr(self.module_controller.orpheus_options, "quality_tier", None)
+        quality = None
+        if quality_tier is not None:
+            quality = "medium" if self.download_mode == "stream" else self.quality_parse[quality_tier]
+
+        indexed = self.download_index.indexed(tracks, quality)
+        if indexed:
+            self.print(f"Beatport: skipping {len(indexed)} already downloaded tracks")
+
+        return [t for t in tracks if str(t.get("id")) not in indexed]
+
+    def _start_job(self, job: str, tracks: list) -> list:
+        self._complete_track()
+        tracks = self._skip_indexed(tracks)
+
+        # skip the tracks which were already downloaded by an interrupted run of the same job
+        if self.manifests is not None:
+            completed = self.manifests.start(job, [t.get("id") for t in tracks])
+            if completed:
+                self.print(f"Beatport: resuming {job}, skipping {len(completed)} already downloaded tracks")
+
+            tracks = [t for t in tracks if str(t.get("id")) not in completed]
+            for track in tracks:
+                self.track_jobs[str(track.get("id"))] = job
+
+        if job in self.sync_pending:
+            self.sync_pending[job][2] = {str(t.get("id")) for t in tracks}
+            for track in tracks:
+                self.sync_tracks[str(track.get("id"))] = job
+            self._save_snapshot(job)
+
+        return tracks
+
+    def _save_snapshot(self, collection: str):
+        # saves the snapshot of an incremental sync once all of its new tracks are completed
+        modified, track_ids, remaining = self.sync_pending[collection]
+        if not remaining:
+            self.snapshots.save(collection, modified, track_ids)
+            del self.sync_pending[collection]
+
+    def _skip_sync_track(self, track_id: str, completed: bool):
+        # a track which can't be downloaded (yet) is not part of the snapshot, so the next sync tries it again
+        collection = self.sync_tracks.pop(track_id, None)
+        if collection is None or collection not in self.sync_pending:
+            return
+
+        self.sync_pending[collection][2].discard(track_id)
+        if not completed:
+            self.sync_pending[collection][1].discard(track_id)
+        self._save_snapshot(collection)
+
+    def _expand(self, job: str, get_tracks) -> list:
+        # with a work queue, only one node fetches the tracks of a collection and shares them with the other nodes
+        if self.work_queue is None:
+            return get_tracks()
+
+        while True:
+            tracks = self.work_queue.get_metadata(f"tracks_{job}")
+            if tracks is not None:
+                return tracks
+
+            if not self.work_queue.claim_item("expand", job):
+                # another node is fetching the tracks right now
+                time.sleep(1)
+                continue
+
+            try:
+                tracks = get_tracks()
+            except BaseException:
+                self.work_queue.release("expand", job)
+                raise
+
+            self.work_queue.set_metadata(f"tracks_{job}", tracks)
+            self.work_queue.complete("expand", job)
+            return tracks
+
+    def _track_ids(self, job: str, tracks: list) -> list:
+        # the track ids of a collection, with a work queue they are claimed one by one in get_track_info(), orpheus
+        # collects all track ids of an artist before downloading the first one
+        track_ids = [t.get("id") for t in tracks]
+        if self.work_queue is not None:
+            self.work_queue.enqueue(job, track_ids)
+            for track_id in track_ids:
+                self.queued_tracks[str(track_id)] = job
+
+        return track_ids
+
+    def _claim_track(self, track_id: str) -> bool:
+        # returns False if another node is downloading or already downloaded the queued track
+        job = self.queued_tracks.get(track_id)
+        if job is None:
+            return True
+
+        if not self.work_queue.claim(job, track_id):
+            return False
+
+        self.claimed_tracks[track_id] = job
+        return True
+
+    def _release_track(self, track_id: str):
+        # give up the claim, so another node or the next run downloads the track
+        job = self.claimed_tracks.pop(track_id, None)
+        if job is not None:
+            self.work_queue.release(job, track_id)
+
+    def _complete_track(self):
+        # orpheus tags, converts and moves a file after get_track_download() and skips existing files without calling
+        # it, so a track only counts as completed once orpheus asks for the next track or collection or the run ends
+        track_id, self.pending_track = self.pending_track, None
+        if track_id is None:
+            return
+
+        job = self.track_jobs.pop(track_id, None)
+        if job is not None:
+            self.manifests.complete(job, track_id)
+
+        job = self.claimed_tracks.pop(track_id, None)
+        if job is not None:
+            self.work_queue.complete(job, track_id)
+
+        self._skip_sync_track(track_id, completed=True)
+
+    def _finish_run(self):
+        # the last track of the run is completed once orpheus is done, unless the run was stopped by an unhandled
+        # exception (e.g. Ctrl+C) while orpheus still downloaded, tagged or moved it
+        if not hasattr(sys, "last_value"):
+            self._complete_track()
+
+    def _set_download_queue(self, track_ids):
+        if self.prefetcher is not None and self.download_index is not None:
+            # the indexed tracks don't need a download URL
+            indexed = self.download_index.indexed([{"id": t} for t in track_ids])
+            track_ids = [t for t in track_ids if str(t) not in indexed]
+
+        if self.prefetcher is not None:
+            self.prefetcher.set_queue(track_ids)
 
     def _save_session(self) -> dict:
         # save the new access_token, refresh_token and expires in the temporary settings
@@ -74,16 +560,10 @@ class ModuleInterface:
     def refresh_login(self):
         logging.debug(f"Beatport: access_token expired, getting a new one")
 
-        # get a new access_token and refresh_token from the API
-        refresh_data = self.session.refresh()
-        if refresh_data and refresh_data.get("error") == "invalid_grant":
-            # if the refresh token is invalid, trigger login
-            self.login(self.module_controller.module_settings["username"],
-                       self.module_controller.module_settings["password"])
-            return
+        # get a new access_token and refresh_token from the API, BeatportApi logs in again with the credentials if the
+        # refresh_token is invalid and calls _save_session() afterwards
+        self.session.refresh_access_token()
 
-        self._save_session()
-            
     def login(self, email: str, password: str):
         logging.debug(f"Beatport: no session found, login")
         login_data = self.session.auth(email, password)
@@ -95,64 +575,184 @@ class ModuleInterface:
 
         return self._save_session()
 
+    def _check_subscription(self) -> str:
+        # get the subscription from the API and cache it together with the resulting quality_parse
+        subscription = self.session.get_account().get("subscription") or ""
+
+        # start from the defaults, the subscription could also be downgraded since the last check. The new mapping is
+        # built on its own and assigned at once, the revalidation runs while tracks are downloaded
+        quality_parse = {q: "medium" for q in self.quality_parse}
+        # Essentials = "bp_basic", Professional = "bp_link_pro", Professional+ = "bp_link_pro_plus_2"
+        if subscription.startswith("bp_link_pro"):
+            # Pro subscription, set the quality to high and lossless
+            quality_parse[QualityEnum.HIGH] = "high"
+            quality_parse[QualityEnum.HIFI] = "lossless"
+            quality_parse[QualityEnum.LOSSLESS] = "lossless"
+        self.quality_parse = quality_parse
+
+        temporary_settings = self.module_controller.temporary_settings_controller
+        if not subscription:
+            # only an active subscription is cached, so the next start checks again
+            temporary_settings.set("subscription_checked", None)
+            return subscription
+
+        temporary_settings.set("subscription", subscription)
+        temporary_settings.set("quality_parse", {q.name: v for q, v in self.quality_parse.items()})
+        temporary_settings.set("subscription_checked", datetime.now())
+        return subscription
+
+    def _revalidate_subscription(self):
+        try:
+            if not self._check_subscription():
+                self.print("Beatport: Account does not have an active 'Link' subscription anymore")
+        except Exception as e:
+            # the cached subscription is used until the next start
+            logging.debug(f"Beatport: subscription revalidation failed: {e}")
+
     def valid_account(self):
-        if not self.disable_subscription_check:
-            # get the subscription from the API and check if it's at least a "Link" subscription
-            account_data = self.session.get_account()
-            if not account_data.get("subscription"):
-                raise self.exception("Beatport: Account does not have an active 'Link' subscription")
-
-            # Essentials = "bp_basic", Professional = "bp_link_pro", Professional+ = "bp_link_pro_plus_2"
-            if account_data.get("subscription").startswith("bp_link_pro"):
-                # Pro subscription, set the quality to high and lossless
-                self.print("Beatport: Professional subscription detected, allowing high and lossless quality")
-                self.quality_parse[QualityEnum.HIGH] = "high"
-                self.quality_parse[QualityEnum.HIFI] = "lossless"
-                self.quality_parse[QualityEnum.LOSSLESS] = "lossless"
+        if self.disable_subscription_check:
+            return
 
-    def custom_url_parse(self, link: str):
-        match = re.search(r"https?://(www.)?beatport.com/(?:[a-z]{2}/)?.*?"
-                          r"(?P<type>track|release|artist|playlists|chart)/[^/]+/(?P<id>\d+)", link)
-
-        # so parse the regex "match" to the actual DownloadTypeEnum
-        media_types = {
-            "track": DownloadTypeEnum.track,
-            "release": DownloadTypeEnum.album,
-            "artist": DownloadTypeEnum.artist,
-            "playlists": DownloadTypeEnum.playlist,
-            "chart": DownloadTypeEnum.playlist
-        }
+        temporary_settings = self.module_controller.temporary_settings_controller
+        subscription = temporary_settings.read("subscription")
+        quality_parse = temporary_settings.read("quality_parse")
+        checked = temporary_settings.read("subscription_checked")
 
+        if not subscription or quality_parse is None or checked is None:
+            # nothing cached yet, check if it's at least a "Link" subscription
+            subscription = self._check_subscription()
+        else:
+            self.quality_parse = {**self.quality_parse, **{QualityEnum[q]: v for q, v in quality_parse.items()}}
+            if datetime.now() - checked > timedelta(hours=float(self._setting("subscription_cache_hours"))):
+                # use the cached subscription for now and revalidate it in the background
+                threading.Thread(target=self._revalidate_subscription, name="beatport-subscription",
+                                 daemon=True).start()
+
+        if not subscription:
+            raise self.exception("Beatport: Account does not have an active 'Link' subscription")
+
+        if subscription.startswith("bp_link_pro"):
+            self.print("Beatport: Professional subscription detected, allowing high and lossless quality")
+
+    @staticmethod
+    def _parse_url(link: str) -> MediaIdentification or None:
+        match = URL_PATTERN.search(link)
         if not match:
-            self.print(f"Beatport: URL {link} is not supported")
-            exit()
+            return None
+
+        # check if the playlist is a user playlist or DJ charts, only needed for get_playlist_info()
+        extra_kwargs = {"is_chart": match.group("type") == "chart"}
+        if match.group("type") == "label":
+            # only needed for get_artist_info()
+            extra_kwargs["is_label"] = True
+        elif match.group("type") == "genre":
+            extra_kwargs["is_genre"] = True
 
         return MediaIdentification(
-            media_type=media_types[match.group("type")],
+            media_type=URL_MEDIA_TYPES[match.group("type")],
             media_id=match.group("id"),
-            # check if the playlist is a user playlist or DJ charts, only needed for get_playlist_info()
-            extra_kwargs={"is_chart": match.group("type") == "chart"}
+            extra_kwargs=extra_kwargs
         )
 
-    @staticmethod
-    def _generate_artwork_url(cover_url: str, size: int, max_size: int = 1400):
+    def custom_url_parse(self, link: str):
+        media_identification = self._parse_url(link)
+        if media_identification is None:
+            raise self.exception(f"Beatport: URL {link} is not supported")
+
+        return media_identification
+
+    def parse_urls(self, links: list) -> tuple:
+        # bulk ingestion of URL lists: returns the deduplicated MediaIdentifications in input order and the
+        # unsupported URLs instead of stopping at the first one
+        media_identifications = {}
+        unsupported = []
+        for link in links:
+            link = link.strip()
+            if not link:
+                continue
+
+            media_identification = self._parse_url(link)
+            if media_identification is None:
+                unsupported.append(link)
+                continue
+
+            # the same id can be a track, a release, a chart, ...
+            key = (media_identification.media_type, media_identification.media_id,
+                   tuple(sorted(media_identification.extra_kwargs.items())))
+            media_identifications.setdefault(key, media_identification)
+
+        for link in unsupported:
+            self.print(f"Beatport: URL {link} is not supported")
+
+        return list(media_identifications.values()), unsupported
+
+    def _generate_artwork_url(self, cover_url: str, size: int, max_size: int = 1400):
         # if more than max_size are requested, cap the size at max_size
         if size > max_size:
             size = max_size
 
-        # check if it"s a dynamic_uri, if not make it one
-        res_pattern = re.compile(r"\d{3,4}x\d{3,4}")
-        match = re.search(res_pattern, cover_url)
-        if match:
-            # replace the hardcoded resolution with dynamic one
-            cover_url = re.sub(res_pattern, "{w}x{h}", cover_url)
-
         # replace the dynamic_uri h and w parameter with the wanted size
-        return cover_url.format(w=size, h=size)
+        cover_url = artwork_template(cover_url).format(w=size, h=size)
+        return self.artwork.url(cover_url) if self.artwork is not None else cover_url
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        # "Daft  Punk " and "daft punk" return the same results
+        return " ".join(query.casefold().split())
+
+    def _get_cached_search(self, query: str, limit: int) -> dict or None:
+        with self._search_lock:
+            cached = self.search_cache.get(query)
+            # a response with more results per type can serve a smaller limit as well
+            if cached is None or cached[0] < limit:
+                return None
+
+            self.search_cache.move_to_end(query)
+            return cached[1]
+
+    def _set_cached_search(self, query: str, limit: int, results: dict):
+        if self.search_cache_size <= 0:
+            return
+
+        with self._search_lock:
+            self.search_cache[query] = (limit, results)
+            self.search_cache.move_to_end(query)
+            while len(self.search_cache) > self.search_cache_size:
+                self.search_cache.popitem(last=False)
+
+    def _get_search(self, query: str, limit: int) -> dict:
+        # the response contains the tracks, releases, charts and artists, so every type is served by one request
+        query = self._normalize_query(query)
+        results = self._get_cached_search(query, limit)
+        if results is None:
+            results = self.session.get_search(query, per_page=limit)
+            self._set_cached_search(query, limit, results)
+
+        return results
 
     def search(self, query_type: DownloadTypeEnum, query: str, track_info: TrackInfo = None, limit: int = 20):
-        results = self.session.get_search(query)
+        return self._parse_search(query_type, self._get_search(query, limit), limit)
 
+    def search_batch(self, query_type: DownloadTypeEnum, queries: list, limit: int = 20) -> dict:
+        # runs all queries concurrently, returns a dict of every query and its SearchResults or the raised exception
+        normalized = {query: self._normalize_query(query) for query in queries}
+        responses = {q: self._get_cached_search(q, limit) for q in set(normalized.values())}
+
+        missing = [q for q, results in responses.items() if results is None]
+        for query, results in zip(missing, self._bulk_call("get_search", [(q, limit) for q in missing])):
+            responses[query] = results
+            if not isinstance(results, Exception):
+                self._set_cached_search(query, limit, results)
+
+        items = {}
+        for query, normalized_query in normalized.items():
+            results = responses[normalized_query]
+            items[query] = results if isinstance(results, Exception) else \
+                self._parse_search(query_type, results, limit)
+
+        return items
+
+    def _parse_search(self, query_type: DownloadTypeEnum, results: dict, limit: int) -> list:
         name_parse = {
             "track": "tracks",
             "album": "releases",
@@ -161,7 +761,7 @@ class ModuleInterface:
         }
 
         items = []
-        for i in results.get(name_parse.get(query_type.name)):
+        for i in (results.get(name_parse.get(query_type.name)) or [])[:limit]:
             additional = []
             duration = None
             if query_type is DownloadTypeEnum.playlist:
@@ -201,40 +801,107 @@ class ModuleInterface:
 
         return items
 
-    def get_playlist_info(self, playlist_id: str, is_chart: bool = False) -> PlaylistInfo:
+    def _get_playlist_tracks(self, playlist_id: str, is_chart: bool) -> list:
+        # now fetch all the found total_items
+        if is_chart:
+            return self._fetch_pages(lambda page: self.session.get_chart_tracks(playlist_id, page=page),
+                                     self.session.get_chart_tracks(playlist_id))
+
+        # unfold the track element
+        return [t.get("track") for t in self._fetch_pages(
+            lambda page: self.session.get_playlist_tracks(playlist_id, page=page),
+            self.session.get_playlist_tracks(playlist_id))]
+
+    def _sync_playlist_tracks(self, collection: str, modified: str or None, get_tracks) -> list:
+        # incremental sync: skip unchanged collections and only return the tracks which are new since the last sync
+        snapshot = self.snapshots.get(collection)
+        if snapshot is not None and modified and snapshot.modified == modified:
+            self.print(f"Beatport: {collection} did not change since the last sync, skipping")
+            return []
+
+        tracks = get_tracks()
+        # saved by _start_job() or once the new tracks are completed, see _save_snapshot()
+        self.sync_pending[collection] = [modified, {str(t.get("id")) for t in tracks}, set()]
+        if snapshot is None:
+            return tracks
+
+        return [t for t in tracks if str(t.get("id")) not in snapshot.track_ids]
+
+    def _sync_artist_tracks(self, artist_id: str) -> list:
+        collection = f"artist_{artist_id}"
+        snapshot = self.snapshots.get(collection)
+        if snapshot is None:
+            tracks = self._fetch_pages(lambda page: self.session.get_artist_tracks(artist_id, page=page),
+                                       self.session.get_artist_tracks(artist_id))
+            self.sync_pending[collection] = [None, {str(t.get("id")) for t in tracks}, set()]
+            return tracks
+
+        # artists have no modification date, so walk the tracks from the newest to the oldest until known tracks show up
+        new_tracks = []
+        page = 1
+        while True:
+            page_data = self.session.get_artist_tracks(artist_id, page=page, order_by="-publish_date")
+            results = page_data.get("results")
+            new_results = [t for t in results if str(t.get("id")) not in snapshot.track_ids]
+            new_tracks += new_results
+
+            if len(new_results) < len(results) or page * 100 >= (page_data.get("count") or 0):
+                break
+            page += 1
+
+        self.sync_pending[collection] = [None, snapshot.track_ids | {str(t.get("id")) for t in new_tracks}, set()]
+        return new_tracks
+
+    def get_genre_info(self, genre_id: str) -> PlaylistInfo:
+        genre_data = self.session.get_genre(genre_id)
+
+        # the top 100 tracks of the genre
+        genre_tracks = self._expand(f"genre_{genre_id}", lambda: self._fetch_pages(
+            lambda page: self.session.get_genre_top_tracks(genre_id, page=page),
+            self.session.get_genre_top_tracks(genre_id)))
+        genre_tracks = self._start_job(f"genre_{genre_id}", genre_tracks)
+        self._prefetch_releases(genre_tracks)
+        self._set_download_queue([t.get("id") for t in genre_tracks])
+
+        # genres don't have an image, use the one of the current number one
+        cover_url = genre_tracks[0].get("release").get("image").get("dynamic_uri") if genre_tracks else None
+
+        return PlaylistInfo(
+            name=f"{genre_data.get('name')} Top 100",
+            creator="Beatport",
+            release_year=str(datetime.now().year),
+            duration=sum([(t.get("length_ms") or 0) // 1000 for t in genre_tracks]),
+            tracks=self._track_ids(f"genre_{genre_id}", genre_tracks),
+            cover_url=self._generate_artwork_url(cover_url, self.cover_size) if cover_url else None,
+            track_extra_kwargs={"data": {t.get("id"): self.records.track(t) for t in genre_tracks}}
+        )
+
+    def get_playlist_info(self, playlist_id: str, is_chart: bool = False, is_genre: bool = False) -> PlaylistInfo:
+        if is_genre:
+            return self.get_genre_info(playlist_id)
+
         # get the DJ chart or user playlist
         if is_chart:
             playlist_data = self.session.get_chart(playlist_id)
-            playlist_tracks_data = self.session.get_chart_tracks(playlist_id)
         else:
             playlist_data = self.session.get_playlist(playlist_id)
-            playlist_tracks_data = self.session.get_playlist_tracks(playlist_id)
 
         cache = {"data": {}}
 
-        # now fetch all the found total_items
-        if is_chart:
-            playlist_tracks = playlist_tracks_data.get("results")
+        collection = f"{'chart' if is_chart else 'playlist'}_{playlist_id}"
+        if self.snapshots is not None:
+            modified = playlist_data.get("change_date") if is_chart else playlist_data.get("updated_date")
+            playlist_tracks = self._sync_playlist_tracks(collection, modified, lambda: self._expand(
+                collection, lambda: self._get_playlist_tracks(playlist_id, is_chart)))
         else:
-            playlist_tracks = [t.get("track") for t in playlist_tracks_data.get("results")]
-
-        total_tracks = playlist_tracks_data.get("count")
-        for page in range(2, (total_tracks - 1) // 100 + 2):
-            print(f"Fetching {len(playlist_tracks)}/{total_tracks}", end="\r")
-            # get the DJ chart or user playlist
-            if is_chart:
-                playlist_tracks += self.session.get_chart_tracks(playlist_id, page=page).get("results")
-            else:
-                # unfold the track element
-                playlist_tracks += [t.get("track")
-                                    for t in self.session.get_playlist_tracks(playlist_id, page=page).get("results")]
+            playlist_tracks = self._expand(collection, lambda: self._get_playlist_tracks(playlist_id, is_chart))
 
-        for i, track in enumerate(playlist_tracks):
-            # add the track numbers
-            track["track_number"] = i + 1
-            track["total_tracks"] = total_tracks
-            # add the modified track to the track_extra_kwargs
-            cache["data"][track.get("id")] = track
+        playlist_tracks = self._start_job(collection, playlist_tracks)
+        self._prefetch_releases(playlist_tracks)
+
+        for track in playlist_tracks:
+            # add the compact track to the track_extra_kwargs
+            cache["data"][track.get("id")] = self.records.track(track)
 
         creator = "User"
         if is_chart:
@@ -246,31 +913,54 @@ class ModuleInterface:
             # always get the first image of the four total images, why is there no dynamic_uri available? Annoying
             cover_url = playlist_data.get("release_images")[0]
 
+        self._set_download_queue([t.get("id") for t in playlist_tracks])
+
         return PlaylistInfo(
             name=playlist_data.get("name"),
             creator=creator,
             release_year=release_year,
             duration=sum([(t.get("length_ms") or 0) // 1000 for t in playlist_tracks]),
-            tracks=[t.get("id") for t in playlist_tracks],
+            tracks=self._track_ids(collection, playlist_tracks),
             cover_url=self._generate_artwork_url(cover_url, self.cover_size),
             track_extra_kwargs=cache
         )
 
-    def get_artist_info(self, artist_id: str, get_credited_albums: bool, is_chart: bool = False) -> ArtistInfo:
+    def get_label_info(self, label_id: str) -> ArtistInfo:
+        label_data = self.session.get_label(label_id)
+        label_releases_data = self.session.get_label_releases(label_id)
+
+        # the whole discography of the label, the releases are passed on to get_album_info()
+        label_releases = self._fetch_pages(
+            lambda page: self.session.get_label_releases(label_id, page=page), label_releases_data)
+
+        return ArtistInfo(
+            name=label_data.get("name"),
+            albums=[r.get("id") for r in label_releases],
+            album_extra_kwargs={"data": {r.get("id"): self.records.release(r) for r in label_releases}},
+        )
+
+    def get_artist_info(self, artist_id: str, get_credited_albums: bool, is_chart: bool = False,
+                        is_label: bool = False) -> ArtistInfo:
+        if is_label:
+            return self.get_label_info(artist_id)
+
         artist_data = self.session.get_artist(artist_id)
-        artist_tracks_data = self.session.get_artist_tracks(artist_id)
 
-        # now fetch all the found total_items
-        artist_tracks = artist_tracks_data.get("results")
-        total_tracks = artist_tracks_data.get("count")
-        for page in range(2, total_tracks // 100 + 2):
-            print(f"Fetching {page * 100}/{total_tracks}", end="\r")
-            artist_tracks += self.session.get_artist_tracks(artist_id, page=page).get("results")
+        if self.snapshots is not None:
+            artist_tracks = self._sync_artist_tracks(artist_id)
+        else:
+            # now fetch all the found total_items
+            artist_tracks = self._expand(f"artist_{artist_id}", lambda: self._fetch_pages(
+                lambda page: self.session.get_artist_tracks(artist_id, page=page),
+                self.session.get_artist_tracks(artist_id)))
+        artist_tracks = self._start_job(f"artist_{artist_id}", artist_tracks)
+        self._prefetch_releases(artist_tracks)
+        self._set_download_queue([t.get("id") for t in artist_tracks])
 
         return ArtistInfo(
             name=artist_data.get("name"),
-            tracks=[t.get("id") for t in artist_tracks],
-            track_extra_kwargs={"data": {t.get("id"): t for t in artist_tracks}},
+            tracks=self._track_ids(f"artist_{artist_id}", artist_tracks),
+            track_extra_kwargs={"data": {t.get("id"): self.records.track(t) for t in artist_tracks}},
         )
 
     def get_album_info(self, album_id: str, data=None, is_chart: bool = False) -> AlbumInfo or None:
@@ -278,38 +968,44 @@ class ModuleInterface:
         if data is None:
             data = {}
 
+        # only use complete releases, search results and track listings only contain a short version of it
+        if album_id in data and self.records.release(data[album_id]).complete:
+            self.releases[str(album_id)] = self.records.release(data[album_id])
+
         try:
-            album_data = data.get(album_id) if album_id in data else self.session.get_release(album_id)
+            album_data = self._get_release(album_id)
         except BeatportError as e:
             self.print(f"Beatport: Album {album_id} is {str(e)}")
             return
 
-        tracks_data = self.session.get_release_tracks(album_id)
-
         # now fetch all the found total_items
-        tracks = tracks_data.get("results")
-        total_tracks = tracks_data.get("count")
-        for page in range(2, total_tracks // 100 + 2):
-            print(f"Fetching {len(tracks)}/{total_tracks}", end="\r")
-            tracks += self.session.get_release_tracks(album_id, page=page).get("results")
+        tracks = self._expand(f"release_{album_id}", lambda: self._fetch_pages(
+            lambda page: self.session.get_release_tracks(album_id, page=page),
+            self.session.get_release_tracks(album_id)))
 
-        cache = {"data": {album_id: album_data}}
         for i, track in enumerate(tracks):
             # add the track numbers
             track["number"] = i + 1
-            # add the modified track to the track_extra_kwargs
-            cache["data"][track.get("id")] = track
+
+        tracks = self._start_job(f"release_{album_id}", tracks)
+
+        cache = {"data": {album_id: album_data}}
+        for track in tracks:
+            # add the compact track to the track_extra_kwargs
+            cache["data"][track.get("id")] = self.records.track(track)
+
+        self._set_download_queue([t.get("id") for t in tracks])
 
         return AlbumInfo(
-            name=album_data.get("name"),
-            release_year=album_data.get("publish_date")[:4] if album_data.get("publish_date") else None,
+            name=album_data.name,
+            release_year=album_data.publish_date[:4] if album_data.publish_date else None,
             # sum up all the individual track lengths
             duration=sum([t.get("length_ms") // 1000 for t in tracks]),
-            upc=album_data.get("upc"),
-            cover_url=self._generate_artwork_url(album_data.get("image").get("dynamic_uri"), self.cover_size),
-            artist=album_data.get("artists")[0].get("name"),
-            artist_id=album_data.get("artists")[0].get("id"),
-            tracks=[t.get("id") for t in tracks],
+            upc=album_data.upc,
+            cover_url=self._generate_artwork_url(album_data.image_uri, self.cover_size),
+            artist=album_data.artists[0].name,
+            artist_id=album_data.artists[0].id,
+            tracks=self._track_ids(f"release_{album_id}", tracks),
             track_extra_kwargs=cache,
         )
 
@@ -318,100 +1014,208 @@ class ModuleInterface:
         if data is None:
             data = {}
 
-        track_data = data[track_id] if track_id in data else self.session.get_track(track_id)
+        self._complete_track()
+        track_data = self.records.track(data[track_id] if track_id in data else self.session.get_track(track_id))
 
-        album_id = track_data.get("release").get("id")
-        album_data = {}
+        album_id = track_data.release.id
+        # the short release of the track, replaced by the complete one if available
+        album_data = track_data.release
         error = None
 
         try:
-            album_data = data[album_id] if album_id in data else self.session.get_release(album_id)
+            album_data = self.records.release(data[album_id]) if album_id in data else self._get_release(album_id)
+        except BeatportError as e:
+            error = f"Album {album_id} is {str(e)}"
         except ConnectionError as e:
             # check if the album is region locked
             if "Territory Restricted." in str(e):
                 error = f"Album {album_id} is region locked"
+            elif not self._permanent_error(e):
+                # throttled or failing, don't tag the track with the short release
+                raise
 
-        track_name = track_data.get("name")
-        track_name += f" ({track_data.get('mix_name')})" if track_data.get("mix_name") else ""
+        track_name = track_data.name
+        track_name += f" ({track_data.mix_name})" if track_data.mix_name else ""
 
-        release_year = track_data.get("publish_date")[:4] if track_data.get("publish_date") else None
-        genres = [track_data.get("genre").get("name")]
+        release_year = track_data.publish_date[:4] if track_data.publish_date else None
+        genres = [track_data.genre]
         # check if a second genre exists
-        genres += [track_data.get("sub_genre").get("name")] if track_data.get("sub_genre") else []
+        genres += [track_data.sub_genre] if track_data.sub_genre else []
 
         extra_tags = {}
-        if track_data.get("bpm"):
-            extra_tags["BPM"] = str(track_data.get("bpm"))
-        if track_data.get("key"):
-            extra_tags["Key"] = track_data.get("key").get("name")
-        if track_data.get("catalog_number"):
-            extra_tags["Catalog number"] = track_data.get("catalog_number")
-
+        if track_data.bpm:
+            extra_tags["BPM"] = str(track_data.bpm)
+        if track_data.key:
+            extra_tags["Key"] = track_data.key
+        if track_data.catalog_number:
+            extra_tags["Catalog number"] = track_data.catalog_number
+
+        label = track_data.release.label.name if track_data.release.label else None
         tags = Tags(
-            album_artist=album_data.get("artists", [{}])[0].get("name"),
-            track_number=track_data.get("number"),
-            total_tracks=album_data.get("track_count"),
-            upc=album_data.get("upc"),
-            isrc=track_data.get("isrc"),
+            album_artist=album_data.artists[0].name if album_data.artists else None,
+            track_number=track_data.number,
+            total_tracks=album_data.track_count,
+            upc=album_data.upc,
+            isrc=track_data.isrc,
             genres=genres,
-            release_date=track_data.get("publish_date"),
-            copyright=f"© {release_year} {track_data.get('release').get('label').get('name')}",
-            label=track_data.get("release").get("label").get("name"),
+            release_date=track_data.publish_date,
+            copyright=f"© {release_year} {label}",
+            label=label,
             extra_tags=extra_tags
         )
 
-        if not track_data["is_available_for_streaming"]:
-            error = f"Track '{track_data.get('name')}' is not streamable!"
-        elif track_data.get("preorder"):
-            error = f"Track '{track_data.get('name')}' is not yet released!"
+        if not track_data.is_available_for_streaming:
+            error = f"Track '{track_data.name}' is not streamable!"
+        elif track_data.preorder:
+            error = f"Track '{track_data.name}' is not yet released!"
 
-        quality = self.quality_parse[quality_tier]
+        # the stream is always 128k AAC
+        quality = self.quality_parse[quality_tier] if self.download_mode != "stream" else "medium"
         bitrate = {
             "lossless": 1411,
             "high": 256,
             "medium": 128,
         }
-        length_ms = track_data.get("length_ms")
+        length_ms = track_data.length_ms
 
         track_info = TrackInfo(
             name=track_name,
-            album=album_data.get("name"),
-            album_id=album_data.get("id"),
-            artists=[a.get("name") for a in track_data.get("artists")],
-            artist_id=track_data.get("artists")[0].get("id"),
+            album=album_data.name,
+            album_id=album_data.id,
+            artists=[a.name for a in track_data.artists],
+            artist_id=track_data.artists[0].id,
             release_year=release_year,
             duration=length_ms // 1000 if length_ms else None,
             bitrate=bitrate[quality],
             bit_depth=16 if quality == "lossless" else None,  # https://en.wikipedia.org/wiki/Audio_bit_depth#cite_ref-1
             sample_rate=44.1,
-            cover_url=self._generate_artwork_url(
-                track_data.get("release").get("image").get("dynamic_uri"), self.cover_size),
+            cover_url=self._generate_artwork_url(track_data.release.image_uri, self.cover_size),
             tags=tags,
             codec=CodecEnum.FLAC if quality == "lossless" else CodecEnum.AAC,
-            download_extra_kwargs={"track_id": track_id, "quality_tier": quality_tier},
+            download_extra_kwargs={"track_id": track_id, "quality_tier": quality_tier, "isrc": track_data.isrc},
             error=error
         )
 
+        if error is None and not self._claim_track(str(track_id)):
+            # the work queue keeps track of it, so it's part of the snapshot
+            track_info.error = f"Track '{track_data.name}' is already downloaded by another node"
+            self._skip_sync_track(str(track_id), completed=True)
+        elif error is None:
+            self.pending_track = str(track_id)
+        else:
+            self._skip_sync_track(str(track_id), completed=False)
+
         return track_info
 
     def get_track_cover(self, track_id: str, cover_options: CoverOptions, data=None) -> CoverInfo:
         if data is None:
             data = {}
 
-        track_data = data[track_id] if track_id in data else self.session.get_track(track_id)
-        cover_url = track_data.get("release").get("image").get("dynamic_uri")
+        track_data = self.records.track(data[track_id] if track_id in data else self.session.get_track(track_id))
+        # the release record is shared with the memo, so this is the complete release if it was fetched
+        cover_url = track_data.release.image_uri
 
         return CoverInfo(
             url=self._generate_artwork_url(cover_url, cover_options.resolution),
             file_type=ImageFileTypeEnum.jpg)
 
-    def get_track_download(self, track_id: str, quality_tier: QualityEnum) -> TrackDownloadInfo:
-        stream_data = self.session.get_track_download(track_id, self.quality_parse[quality_tier])
+    def _get_track_stream(self, track_id: str) -> TrackDownloadInfo:
+        stream_data = self.session.get_track_stream(track_id)
+        if not stream_data.get("stream_url"):
+            raise self.exception("Could not get stream, exiting")
+
+        # fetch the HLS segments concurrently into one AAC file
+        temp_file_path = self.hls.download(stream_data.get("stream_url"), create_temp_filename())
+        return TrackDownloadInfo(
+            download_type=DownloadEnum.TEMP_FILE_PATH,
+            temp_file_path=temp_file_path
+        )
+
+    def _get_track_download(self, track_id: str, quality_tier: QualityEnum) -> tuple:
+        # returns the TrackDownloadInfo and the actual quality, which is "medium" for the stream
+        if self.download_mode == "stream":
+            return self._get_track_stream(track_id), "medium"
+
+        try:
+            if self.prefetcher is not None:
+                # probably already resolved while the previous track was downloaded
+                stream_data = self.prefetcher.get(track_id, self.quality_parse[quality_tier])
+            else:
+                stream_data = self.session.get_track_download(track_id, self.quality_parse[quality_tier])
+        except ConnectionError as e:
+            # the stream is AAC as well, a FLAC file can't be replaced by it
+            if self.download_mode != "auto" or self.quality_parse[quality_tier] == "lossless":
+                raise
+
+            self.print(f"Beatport: download of track {track_id} failed, falling back to the 128k stream")
+            logging.debug(f"Beatport: download failed: {e}")
+            return self._get_track_stream(track_id), "medium"
 
         if not stream_data.get("location"):
             raise self.exception("Could not get stream, exiting")
 
+        quality = self.quality_parse[quality_tier]
+        if self.manifests is not None:
+            # keep the .part file in the data_dir, so an interrupted download is resumed by the next run
+            part_path = os.path.join(self.data_dir, "partial", f"{track_id}_{quality}.part")
+            os.makedirs(os.path.dirname(part_path), exist_ok=True)
+            self.downloader.download_resumable(stream_data.get("location"), part_path)
+
+            temp_file_path = create_temp_filename()
+            shutil.move(part_path, temp_file_path)
+            return TrackDownloadInfo(
+                download_type=DownloadEnum.TEMP_FILE_PATH,
+                temp_file_path=temp_file_path
+            ), quality
+
+        if self.downloader is not None and quality == "lossless":
+            temp_file_path = self.downloader.download(stream_data.get("location"), create_temp_filename())
+            return TrackDownloadInfo(
+                download_type=DownloadEnum.TEMP_FILE_PATH,
+                temp_file_path=temp_file_path
+            ), quality
+
         return TrackDownloadInfo(
             download_type=DownloadEnum.URL,
             file_url=stream_data.get("location")
-        )
+        ), quality
+
+    def get_track_download(self, track_id: str, quality_tier: QualityEnum, isrc: str = None) -> TrackDownloadInfo:
+        try:
+            return self._download_track(track_id, quality_tier, isrc)
+        except BaseException:
+            # a failed download is never completed
+            if self.pending_track == str(track_id):
+                self.pending_track = None
+                self._release_track(str(track_id))
+            raise
+
+    def _download_track(self, track_id: str, quality_tier: QualityEnum, isrc: str = None) -> TrackDownloadInfo:
+        if self.download_index is None:
+            return self._get_track_download(track_id, quality_tier)[0]
+
+        # the same track or recording (ISRC) was already downloaded by another job, no request needed
+        quality = self.quality_parse[quality_tier] if self.download_mode != "stream" else "medium"
+        stored_path = self.download_index.get(track_id, quality, isrc)
+        if stored_path is not None:
+            try:
+                return TrackDownloadInfo(
+                    download_type=DownloadEnum.TEMP_FILE_PATH,
+                    # a copy, orpheus tags the file of every job with its own tags
+                    temp_file_path=shutil.copyfile(stored_path, create_temp_filename())
+                )
+            except FileNotFoundError:
+                # evicted in the meantime, download it again
+                pass
+
+        download_info, quality = self._get_track_download(track_id, quality_tier)
+        if download_info.download_type is DownloadEnum.URL:
+            # the file is needed for the index, so download it here instead of orpheus
+            download_info = TrackDownloadInfo(
+                download_type=DownloadEnum.TEMP_FILE_PATH,
+                temp_file_path=self.downloader.download(download_info.file_url, create_temp_filename())
+            )
+
+        self.download_index.add(track_id, quality, isrc, download_info.temp_file_path,
+                                "flac" if quality == "lossless" else "aac")
+        return download_info
@@ -0,0 +1,48 @@
+"""
+Regression tests against the local stand-in for api.beatport.com/v4, run from the orpheusdl/ directory with:
+
+    python -m pytest modules/beatport/tests
+"""
+
+import pytest
+
+from utils.models import QualityEnum
+from ..benchmarks.bench import create_module
+from ..benchmarks.mock_server import MockBeatportServer, MockBeatportConfig
+
+
+@pytest.fixture
+def server():
+    server = MockBeatportServer(MockBeatportConfig(latency=0, collection_size=5)).start()
+    yield server
+    server.stop()
+
+
+def sync_chart(server: MockBeatportServer, data_dir: str) -> list:
+    # one orpheus run of a chart: get_track_info() of every track, then the end of the run
+    module = create_module(server, data_dir, {"incremental_sync": True, "resume_downloads": True})
+    chart = module.get_playlist_info("2", is_chart=True)
+    for track_id in chart.tracks:
+        assert module.get_track_info(track_id, QualityEnum.HIGH, None, **chart.track_extra_kwargs).error is None
+    module._finish_run()
+    return list(chart.tracks)
+
+
+def test_incremental_sync_twice(server, tmp_path):
+    assert len(sync_chart(server, str(tmp_path))) == 5
+
+    # the snapshot of the first run is saved, so the second run has no new tracks
+    module = create_module(server, str(tmp_path), {"incremental_sync": True})
+    assert module.snapshots.get("chart_2") is not None
+    assert sync_chart(server, str(tmp_path)) == []
+    assert not (tmp_path / "jobs" / "chart_2.json").exists()
+
+
+def test_interrupted_sync(server, tmp_path):
+    # the run ends with an unhandled exception before the last track was done, it's synced again
+    module = create_module(server, str(tmp_path), {"incremental_sync": True, "resume_downloads": True})
+    chart = module.get_playlist_info("2", is_chart=True)
+    module.get_track_info(chart.tracks[0], QualityEnum.HIGH, None, **chart.track_extra_kwargs)
+
+    assert module.snapshots.get("chart_2") is None
+    assert sync_chart(server, str(tmp_path)) == chart.tracks